@@ -10,26 +10,36 @@
 [√]: Store data in database.
 """
 
+import os
+import time
+
 import click
-from flask_migrate import Migrate
 from application import create_app, db
-from application.models import User, Role
+from application.models import User, Role, Outbox, JobRun
 
 app = create_app('default')
-migrate = Migrate(app, db)
+
+if os.environ.get('FLASK_RUN_FROM_CLI'):  # Only `flask db` needs it, not servers importing this module
+    from flask_migrate import Migrate
+    migrate = Migrate(app, db)
 
 
 @app.shell_context_processor
 def make_shell_context() -> dict:
-    variables = dict(db=db, User=User, Role=Role)
+    variables = dict(db=db, User=User, Role=Role, Outbox=Outbox, JobRun=JobRun)
     return variables
 
 
 @app.cli.command()
 @click.argument('test_names', nargs=-1)
-def test(test_names: str) -> None:
+@click.option('--parallel', default=0, help='Spread the test modules across this many worker processes.')
+def test(test_names: str, parallel: int) -> None:
     """Run the unit tests."""
     import unittest
+    if parallel:
+        from tests import parallel as runner
+        runner.run(list(test_names) or runner.discover_modules(), parallel)
+        return
     if test_names:
         tests = unittest.TestLoader().loadTestsFromNames(test_names)
     else:
@@ -37,5 +47,234 @@ def test(test_names: str) -> None:
     unittest.TextTestRunner(verbosity=2).run(tests)
 
 
+@app.cli.command('mail-worker')
+@click.option('--batch-size', default=50, help='Emails claimed and sent per SMTP session.')
+@click.option('--interval', default=5.0, help='Seconds to wait when the outbox is empty.')
+@click.option('--once', is_flag=True, help='Deliver a single batch and exit.')
+def mail_worker(batch_size: int, interval: float, once: bool) -> None:
+    """Deliver queued emails from the outbox."""
+    from application.email import deliver_outbox
+    while True:
+        try:
+            claimed = deliver_outbox(batch_size)
+        except Exception:  # Claimed rows are retried once their lease expires
+            app.logger.exception('Outbox batch failed')
+            db.session.rollback()
+            claimed = 0
+        if claimed:
+            click.echo('Processed %d email(s).' % claimed)
+        if once:
+            break
+        if claimed < batch_size:
+            time.sleep(interval)
+
+
+@app.cli.group('mail')
+def mail_commands() -> None:
+    """Email campaign commands."""
+
+
+@mail_commands.command('resend-confirmations')
+@click.option('--after-id', default=0, help='Resume after this user id, as reported by an earlier run.')
+@click.option('--batch-size', default=500, help='Users read per query.')
+@click.option('--rate', default=10.0, help='Emails per second; 0 for no limit.')
+@click.option('--base-url', help='Site URL for the confirmation links (default: APP_BASE_URL).')
+@click.option('--dry-run', is_flag=True, help='Render the emails without sending them.')
+def resend_confirmations(after_id: int, batch_size: int, rate: float, base_url: str, dry_run: bool) -> None:
+    """Send a new confirmation email to every unconfirmed user."""
+    from application.email import CampaignInterrupted, resend_confirmations as resend
+    try:
+        sent, last_id = resend(base_url or app.config['APP_BASE_URL'], after_id, batch_size, rate, dry_run,
+                               echo=click.echo)
+    except CampaignInterrupted as error:
+        raise click.ClickException('%s; %d emails were sent. Resume with --after-id %d.' %
+                                   (error, error.sent, error.after_id))
+    click.echo('%s %d emails; the last user was %d.' % ('Rendered' if dry_run else 'Sent', sent, last_id))
+
+
+@app.cli.command('db-stats')
+def db_stats() -> None:
+    """Report SQLite page counts, WAL size and checkpoint status."""
+    from application.sqlite import database_stats
+    for name, value in database_stats().items():
+        click.echo('%-20s %s' % (name, value))
+
+
+@app.cli.command('scheduler')
+@click.option('--job', 'job_name', help='Run this job now and exit.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due and exit.')
+def run_scheduler(job_name: str, once: bool) -> None:
+    """Run the maintenance jobs, as the host's leader once no other process is."""
+    from application.scheduler import JOBS
+    scheduler = app.extensions['scheduler']
+
+    def report(run):
+        click.echo('%s %s in %.2fs: %s' % (run.name, run.status, run.duration, run.result))
+
+    if job_name:
+        if job_name not in JOBS:
+            raise click.BadParameter('choose from %s.' % ', '.join(sorted(JOBS)), param_hint='--job')
+        report(scheduler.run_job(job_name))
+    elif once:
+        if not scheduler.lead():
+            raise click.ClickException('Another process on this host is the scheduler leader.')
+        try:
+            for run in scheduler.run_pending():
+                report(run)
+        finally:
+            scheduler.resign()
+    else:
+        scheduler.stop()
+        scheduler.start()
+        scheduler.join()
+
+
+@app.cli.group()
+def templates() -> None:
+    """Template maintenance commands."""
+
+
+@templates.command('compile')
+@click.option('--directory', type=click.Path(file_okay=False), help='Cache directory (default: APP_TEMPLATE_CACHE_DIR).')
+def compile_templates(directory: str) -> None:
+    """Precompile every template into the shared bytecode cache."""
+    from application import templating
+    directory = directory or app.config['APP_TEMPLATE_CACHE_DIR']
+    if not directory:
+        raise click.UsageError('Set APP_TEMPLATE_CACHE_DIR or pass --directory.')
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = templating.SharedBytecodeCache(directory)
+    if app.jinja_env.cache is not None:
+        app.jinja_env.cache.clear()  # Loaded templates would not be written out
+    names, elapsed = templating.compile_templates(app)
+    click.echo('Compiled %d templates into %s in %.2fs.' % (len(names), directory, elapsed))
+
+
+@app.cli.group()
+def assets() -> None:
+    """Static asset commands."""
+
+
+@assets.command('build')
+@click.option('--moment', type=click.Path(exists=True, dir_okay=False), help='Local moment-with-locales.min.js.')
+def build_assets(moment: str) -> None:
+    """Vendor, fingerprint and precompress the static files."""
+    from application.assets import build
+    build(app.static_folder, moment, echo=click.echo)
+
+
+@app.cli.command()
+@click.option('--filter', 'pattern', help='Only run benchmarks whose name contains this text.')
+@click.option('--min-time', default=0.2, help='Seconds spent timing each benchmark.')
+@click.option('--samples', default=15, help='Samples taken per benchmark.')
+@click.option('--output', type=click.Path(), help='Write the results to this JSON file.')
+@click.option('--baseline', type=click.Path(exists=True), help='Compare against a previous JSON result file.')
+@click.option('--threshold', default=0.1, help='Allowed median slowdown against the baseline (0.1 = 10%).')
+def bench(pattern: str, min_time: float, samples: int, output: str, baseline: str, threshold: float) -> None:
+    """Run the micro-benchmarks against an in-memory database."""
+    from benchmarks import runner
+    bench_app = create_app('testing')
+    with bench_app.app_context():
+        db.create_all()
+        results = runner.run(bench_app, pattern, min_time, samples, echo=click.echo)
+    if output:
+        runner.save(results, output)
+    if baseline:
+        regressions = runner.compare(results, baseline, threshold)
+        for name, before, after, change in regressions:
+            click.echo('REGRESSION %s: %.1f us -> %.1f us (%+.0f%%)' % (name, before * 1e6, after * 1e6, change * 100))
+        if regressions:
+            raise SystemExit(1)
+
+
+@app.cli.command()
+@click.option('--users', default=200, help='Synthetic users to seed before the run.')
+@click.option('--clients', default=8, help='Concurrent virtual users.')
+@click.option('--duration', default=30.0, help='Seconds to run.')
+@click.option('--mix', default='index=40,login=25,register=10,confirm=10,reset=15', help='Scenario weights.')
+@click.option('--url', help='Load a running server (sharing this app\'s database) instead of the app in process.')
+@click.option('--seed', default=0, help='Random seed for the scenario sequence.')
+def loadtest(users: int, clients: int, duration: float, mix: str, url: str, seed: int) -> None:
+    """Replay a mix of the authentication flows with concurrent clients."""
+    from benchmarks import loadtest as load
+    if url:
+        target, client_factory = app, lambda: load.HTTPClient(url)
+    else:
+        target = load.create_target_app()
+        client_factory = lambda: load.InProcessClient(target)  # noqa: E731
+    seeded = load.seed_users(target, users, echo=click.echo)
+    recorder, elapsed = load.run(client_factory, seeded, clients, duration, mix=mix, seed=seed)
+    for line in load.report(recorder, elapsed):
+        click.echo(line)
+
+
+@app.cli.group()
+def users() -> None:
+    """Bulk user commands."""
+
+
+@users.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), help='Default: from the file name.')
+@click.option('--batch-size', default=1000, help='Users hashed and inserted per batch.')
+def import_users(source, file_format: str, batch_size: int) -> None:
+    """Import users from a CSV or JSON Lines file ('-' for stdin)."""
+    from application import bulk
+    rows = bulk.read_rows(source, bulk.file_format(source.name, file_format))
+    try:
+        bulk.import_users(rows, batch_size, echo=click.echo)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+
+
+@users.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), help='Default: from the file name.')
+@click.option('--batch-size', default=1000, help='Users fetched per query round trip.')
+def export_users(target, file_format: str, batch_size: int) -> None:
+    """Export every user, with password hashes, to a CSV or JSON Lines file ('-' for stdout)."""
+    from application import bulk
+    bulk.export_users(target, bulk.file_format(target.name, file_format), batch_size,
+                      echo=lambda line: click.echo(line, err=True))
+
+
+@app.cli.group()
+def profile() -> None:
+    """Request profiling commands."""
+
+
+@profile.command('token')
+@click.option('--expiration', default=3600, help='Seconds the token stays valid.')
+def profile_token(expiration: int) -> None:
+    """Print a token for APP_PROFILE_HEADER that has a request profiled."""
+    from application.profiling import generate_profile_token
+    with app.app_context():
+        click.echo(generate_profile_token(expiration))
+
+
+@profile.command('report')
+@click.option('--directory', help='Profile directory (default: APP_PROFILE_DIR).')
+@click.option('--endpoint', help='Only this endpoint.')
+@click.option('--top', default=15, help='Functions to list per endpoint.')
+@click.option('--sort', type=click.Choice(['tottime', 'cumtime']), default='tottime', help='Own or cumulative time.')
+def profile_report(directory: str, endpoint: str, top: int, sort: str) -> None:
+    """Merge the request profiles into the hottest functions per endpoint."""
+    from application.profiling import report
+    lines = report(directory or app.config['APP_PROFILE_DIR'], top, endpoint, sort)
+    for line in lines or ['No profiles found.']:
+        click.echo(line)
+
+
+@app.cli.command('startup-profile')
+@click.option('--config', 'config_name', default='production', help='Configuration to start with.')
+@click.option('--top', default=15, help='Packages and modules to list.')
+def startup_profile(config_name: str, top: int) -> None:
+    """Report the import and create_app time of a fresh worker."""
+    from benchmarks import startup
+    timings, modules, first_use = startup.profile(config_name)
+    for line in startup.report(timings, modules, first_use, top):
+        click.echo(line)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
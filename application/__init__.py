@@ -6,16 +6,25 @@
 from flask import Flask
 from flask_bootstrap import Bootstrap
 from flask_login import LoginManager
-from flask_mail import Mail
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 
+from application.hashing import PasswordHasher
+from application.lazy import LazyExtension
+from application.metrics import Metrics
+from application.pages import PageCache
+from application.profiling import Profiler
+from application.ratelimit import RateLimiter
+from application.routing import RoutingSQLAlchemy
 from config import config
 
 bootstrap = Bootstrap()
-mail = Mail()
-moment = Moment()
-db = SQLAlchemy()
+mail = LazyExtension('flask_mail', 'Mail')
+moment = LazyExtension('flask_moment', 'Moment', template_global='moment')
+db = RoutingSQLAlchemy()
+hasher = PasswordHasher()
+metrics = Metrics()
+page_cache = PageCache()
+profiler = Profiler()
+rate_limiter = RateLimiter()
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -32,12 +41,28 @@ def create_app(config_name):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
+    if app.config['APP_PROXY_HOPS']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['APP_PROXY_HOPS'],
+                                x_proto=app.config['APP_PROXY_HOPS'])
 
     bootstrap.init_app(app)
     mail.init_app(app)
     moment.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
+    hasher.init_app(app)
+    metrics.init_app(app)
+    page_cache.init_app(app)
+    profiler.init_app(app)
+    rate_limiter.init_app(app)
+
+    from application.email import MailDispatcher
+    from application.scheduler import Scheduler
+    from application.sqlite import configure_sqlite
+    MailDispatcher(app)
+    configure_sqlite(app)
+    Scheduler(app)
 
     # --------------------------------------------------------------------------
     # Main Blueprint Registration:
@@ -47,4 +72,17 @@ def create_app(config_name):
 
     app.register_blueprint(main)
     app.register_blueprint(auth, url_prefix='/auth')
+
+    from application.assets import configure_assets
+    from application.templating import configure_templates
+    configure_assets(app)
+    configure_templates(app)
+
+    if app.config['APP_AVAILABILITY_WARM']:
+        from application.auth.availability import availability_index
+        availability_index(app).warm_in_background(app)
+
+    if app.config['APP_COMPRESSION']:
+        from application.compression import configure_compression
+        configure_compression(app)
     return app
@@ -0,0 +1,211 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Static asset pipeline: vendored Bootstrap, jQuery and moment.js,
+fingerprinted file names and precompressed variants, run with
+`flask assets build`.
+
+The build copies the vendored files into static/vendor, then writes every
+static file to static/dist under a name carrying a hash of its content, with
+.gz (and, when the brotli package is installed, .br) variants beside it, and
+a manifest mapping the original names to the fingerprinted ones. url_for
+('static') then points at the fingerprinted file, which is served far-future
+cacheable in the encoding the client accepts.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from urllib.request import urlopen
+
+import flask_bootstrap
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are written without it
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+BOOTSTRAP_STATIC = os.path.join(os.path.dirname(flask_bootstrap.__file__), 'static')
+VENDORED = {
+    'vendor/bootstrap/css/bootstrap.min.css': 'css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.min.js': 'js/bootstrap.min.js',
+    'vendor/bootstrap/fonts/glyphicons-halflings-regular.eot': 'fonts/glyphicons-halflings-regular.eot',
+    'vendor/bootstrap/fonts/glyphicons-halflings-regular.svg': 'fonts/glyphicons-halflings-regular.svg',
+    'vendor/bootstrap/fonts/glyphicons-halflings-regular.ttf': 'fonts/glyphicons-halflings-regular.ttf',
+    'vendor/bootstrap/fonts/glyphicons-halflings-regular.woff': 'fonts/glyphicons-halflings-regular.woff',
+    'vendor/bootstrap/fonts/glyphicons-halflings-regular.woff2': 'fonts/glyphicons-halflings-regular.woff2',
+    'vendor/jquery/jquery.min.js': 'jquery.min.js',
+}
+MOMENT = 'vendor/moment/moment-with-locales.min.js'
+MOMENT_URL = 'https://cdnjs.cloudflare.com/ajax/libs/moment.js/%s/moment-with-locales.min.js'
+
+# Formats that are compressed already.
+INCOMPRESSIBLE = {'.eot', '.gif', '.gz', '.br', '.ico', '.jpeg', '.jpg', '.png', '.woff', '.woff2'}
+CSS_URL = re.compile(r'url\((["\']?)([^"\')]+)\1\)')
+CSS_REFERENCE = re.compile(r'([^?#]*)([?#]?)(.*)')
+
+
+# ------------------------------------------------------------------------------
+# Build:
+# ------------------------------------------------------------------------------
+def vendor(static_folder, moment=None, echo=print):
+    """Copy Flask-Bootstrap's bundled files into static/vendor, and moment.js
+    from the `moment` file or else from the CDN, checked against
+    Flask-Moment's integrity hash."""
+    for target, source in VENDORED.items():
+        path = os.path.join(static_folder, target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(os.path.join(BOOTSTRAP_STATIC, source), path)
+    if moment:
+        with open(moment, 'rb') as file:
+            data = file.read()
+    else:
+        import flask_moment  # Not at module level: create_app imports this module
+        url = MOMENT_URL % flask_moment.default_moment_version
+        try:
+            with urlopen(url, timeout=30) as response:
+                data = response.read()
+        except OSError as error:
+            echo('moment.js not vendored (%s); pages keep loading it from the CDN.' % error)
+            return
+        digest = 'sha256-' + base64.b64encode(hashlib.sha256(data).digest()).decode('ascii')
+        if digest != flask_moment.default_moment_sri:
+            raise ValueError('%s does not match its integrity hash' % url)
+    path = os.path.join(static_folder, MOMENT)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def fingerprinted(name, data):
+    stem, extension = posixpath.splitext(name)
+    return '%s.%s%s' % (stem, hashlib.sha256(data).hexdigest()[:12], extension)
+
+
+def rewrite_css(name, data, manifest):
+    """Point the relative url() references of a stylesheet at the
+    fingerprinted files."""
+
+    def replace(match):
+        quote, reference = match.groups()
+        path, separator, suffix = CSS_REFERENCE.match(reference).groups()
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+        if ':' in path or path.startswith('/') or target not in manifest:
+            return match.group(0)
+        relative = posixpath.relpath(manifest[target], posixpath.join(DIST, posixpath.dirname(name)))
+        return 'url(%s%s%s%s%s)' % (quote, relative, separator, suffix, quote)
+
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def compress(path, data):
+    """Write the .gz and .br variants of `path` where they are smaller."""
+    variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+
+
+def build(static_folder, moment=None, echo=print):
+    """Vendor the third party assets, then fingerprint and compress every
+    static file into static/dist. Returns the manifest."""
+    vendor(static_folder, moment, echo)
+    names = []
+    for directory, subdirectories, files in os.walk(static_folder):
+        relative = os.path.relpath(directory, static_folder).replace(os.sep, '/')
+        if relative == DIST or relative.startswith(DIST + '/'):
+            continue
+        names.extend(posixpath.normpath(posixpath.join(relative, file)) for file in files)
+    manifest = {}
+    # Stylesheets last, so that the files they reference are fingerprinted first
+    for name in sorted(names, key=lambda name: (name.endswith('.css'), name)):
+        with open(os.path.join(static_folder, name), 'rb') as file:
+            data = file.read()
+        if name.endswith('.css'):
+            data = rewrite_css(name, data, manifest)
+        manifest[name] = posixpath.join(DIST, fingerprinted(name, data))
+        path = os.path.join(static_folder, manifest[name])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+        if posixpath.splitext(name)[1].lower() not in INCOMPRESSIBLE:
+            compress(path, data)
+    temporary = os.path.join(static_folder, DIST, MANIFEST + '.tmp')
+    with open(temporary, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temporary, os.path.join(static_folder, DIST, MANIFEST))
+    echo('Built %d assets into %s.' % (len(manifest), os.path.join(static_folder, DIST)))
+    return manifest
+
+
+# ------------------------------------------------------------------------------
+# Serving:
+# ------------------------------------------------------------------------------
+def configure_assets(app):
+    """With APP_ASSETS_ENABLED and a built manifest, make url_for('static')
+    return fingerprinted names and serve those with precompressed variants."""
+    app.add_template_global(asset_url)
+    if not app.config.get('APP_ASSETS_ENABLED') or not app.has_static_folder:
+        return
+    path = os.path.join(app.static_folder, DIST, MANIFEST)
+    if not os.path.exists(path):
+        return
+    with open(path) as file:
+        manifest = json.load(file)
+    app.extensions['assets'] = manifest
+    app.extensions['assets_fingerprinted'] = set(manifest.values())
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = manifest.get(values['filename'], values['filename'])
+
+    static = app.view_functions['static']
+
+    def send_static(filename):
+        if filename not in app.extensions['assets_fingerprinted']:
+            return static(filename)
+        return send_fingerprinted(filename)
+
+    app.view_functions['static'] = send_static
+
+
+def send_fingerprinted(filename):
+    """Send a fingerprinted file, or its brotli or gzip variant when the
+    client accepts it, cacheable for a year."""
+    folder = current_app.static_folder
+    encodings = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings[encoding] and os.path.exists(os.path.join(folder, filename + suffix)):
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(folder, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(folder, filename)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def asset_url(name):
+    """URL of a static file only when the asset build has produced it, for
+    templates that fall back to a CDN."""
+    manifest = current_app.extensions.get('assets')
+    if manifest is None or name not in manifest:
+        return None
+    return url_for('static', filename=name)
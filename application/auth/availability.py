@@ -0,0 +1,141 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Username and email availability checks backed by in-memory Bloom filters."""
+
+import hashlib
+import math
+import os
+import time
+from threading import Lock, Thread
+
+from flask import current_app
+
+from application import db
+from application.models import User, normalize_email
+
+FIELDS = ('email', 'username')
+
+
+class BloomFilter:
+    """Set membership with no false negatives and about `error_rate` false
+    positives once `capacity` values have been added."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2)**2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class AvailabilityIndex:
+    """Bloom filters of taken emails and usernames. A value missing from its
+    filter is free without asking the database; a possible hit is confirmed
+    with a query. The filters are built at start-up with APP_AVAILABILITY_WARM,
+    or else on first use, and rebuilt in a background thread every
+    APP_AVAILABILITY_REFRESH seconds to pick up other workers' registrations.
+    The current filters keep answering during a rebuild; one thread rebuilds
+    at a time. Answers are advisory: the unique constraints stay authoritative."""
+
+    def __init__(self, capacity, error_rate, refresh):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh = refresh
+        self.filters = None
+        self.warmed_at = None
+        self.queries = 0
+        self._lock = Lock()
+        self._pending = None  # Registrations made during a rebuild, not yet in the new filters
+        self._pid = None  # Of the rebuilding process; a forked worker does not inherit the thread
+
+    def _claim(self):
+        """Become the rebuilding thread. Returns False if another one is."""
+        with self._lock:
+            if self._pending is not None and self._pid == os.getpid():
+                return False
+            self._pending, self._pid = [], os.getpid()
+            return True
+
+    def _rebuild(self):
+        try:
+            filters = {field: BloomFilter(self.capacity, self.error_rate) for field in FIELDS}
+            for email, username in db.session.query(User.email_normalized, User.username).yield_per(1000):
+                filters['email'].add(email or '')
+                filters['username'].add(username or '')
+            with self._lock:
+                for email, username in self._pending:
+                    filters['email'].add(email)
+                    filters['username'].add(username)
+                self.filters = filters
+                self.warmed_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def warm(self):
+        """Build the filters now, unless another thread is building them.
+        Returns whether this call built them."""
+        if not self._claim():
+            return False
+        self._rebuild()
+        return True
+
+    def warm_in_background(self, app):
+        """Build the filters in a daemon thread, unless another thread is."""
+        if self._claim():
+            Thread(target=self._rebuild_in, args=(app, ), name='availability-index', daemon=True).start()
+
+    def _rebuild_in(self, app):
+        with app.app_context():
+            try:
+                self._rebuild()
+            except Exception:  # Such as the users table not existing yet; retried on the next check
+                app.logger.exception('Availability index rebuild failed')
+
+    def _ensure_warm(self):
+        """Returns whether the filters can answer."""
+        if self.filters is None:
+            self.warm()
+        elif time.monotonic() - self.warmed_at > self.refresh:
+            self.warm_in_background(current_app._get_current_object())
+        return self.filters is not None
+
+    def add(self, email, username):
+        email = normalize_email(email)
+        with self._lock:
+            if self.filters is not None:
+                self.filters['email'].add(email)
+                self.filters['username'].add(username)
+            if self._pending is not None:
+                self._pending.append((email, username))
+
+    def is_available(self, field, value):
+        if field == 'email':
+            value = normalize_email(value)
+        if self._ensure_warm() and value not in self.filters[field]:
+            return True
+        self.queries += 1  # A possible hit, or no filters while another thread builds the first ones
+        return field not in User.taken_fields(**{field: value})
+
+
+def availability_index(app=None):
+    """Return the application's availability index, created on first use."""
+    app = app or current_app
+    index = app.extensions.get('availability_index')
+    if index is None:
+        index = app.extensions.setdefault(
+            'availability_index',
+            AvailabilityIndex(app.config['APP_AVAILABILITY_CAPACITY'], app.config['APP_AVAILABILITY_ERROR_RATE'],
+                              app.config['APP_AVAILABILITY_REFRESH']))
+    return index
@@ -4,7 +4,6 @@
 
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField
-from wtforms import ValidationError
 from wtforms.validators import DataRequired, Length, Email, Regexp, EqualTo
 
 from application.models import User
@@ -40,17 +39,30 @@ class Registration(FlaskForm):
     password_confirm = PasswordField('Confirm Password', validators=[DataRequired('Password confirmation required')])
     submit = SubmitField('Register')
 
-    def validate_email(self, field):
-        """Custom validation method invoked in addition to email field defined validators.
-        """
-        if User.query.filter_by(email=field.data).first():
-            raise ValidationError('Email already registered')
+    def validate(self):
+        """Run the field validators, then check that email and username are
+        not registered yet with a single query."""
+        valid = super().validate()
+        email = None if self.email.errors else self.email.data
+        username = None if self.username.errors else self.username.data
+        taken = User.taken_fields(email=email, username=username)
+        if 'email' in taken:
+            self.email.errors.append('Email already registered')
+        if 'username' in taken:
+            self.username.errors.append('Username already used')
+        return valid and not taken
 
-    def validate_username(self, field):
-        """Custom validation method invoked in addition to username field defined validators.
-        """
-        if User.query.filter_by(username=field.data).first():
-            raise ValidationError('Username already used')
+    def unique_violation(self, error):
+        """Map an IntegrityError raised by a concurrent registration back to the
+        form field. Returns True when the error was recognised."""
+        message = str(error.orig)
+        if 'users.email' in message:
+            self.email.errors.append('Email already registered')
+        elif 'users.username' in message:
+            self.username.errors.append('Username already used')
+        else:
+            return False
+        return True
 
 
 class ChangePasswordForm(FlaskForm):
@@ -4,15 +4,20 @@
 
 from urllib.parse import urlparse, urljoin
 
-from flask import render_template, redirect, request, url_for, flash, abort
+from flask import current_app, render_template, redirect, request, session, url_for, flash, abort, jsonify
 from flask_login import login_user, logout_user, login_required, fresh_login_required, current_user
+from flask_login.config import COOKIE_NAME
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import safe_str_cmp
 
-from application import db
+from application import db, rate_limiter
 from application.auth import auth
+from application.auth.availability import availability_index
 from application.auth.forms import LoginForm, Registration, ChangePasswordForm, ResetPasswordRequestForm, ResetPasswordForm
 from application.email import send_email
 from application.models import User
+from application.ratelimit import account, remote_address
+from application.tokens import EXPIRED
 
 
 # ------------------------------------------------------------------------------
@@ -28,33 +33,61 @@ def is_safe_url(target):
 # ------------------------------------------------------------------------------
 # Application Request Hooks
 # ------------------------------------------------------------------------------
+def session_user_id():
+    """Return the id of the logged-in user from the session, without loading
+    the user (Flask-Login 0.4 and 0.5 use different keys)."""
+    return session.get('_user_id') or session.get('user_id')
+
+
+def remember_confirmed(user_id):
+    """Record in the signed session that this user is confirmed, so that the
+    request gate passes them without a database lookup."""
+    session['confirmed'] = user_id
+
+
 @auth.before_app_request
 def before_request():
-    """Returns unconfirmed template in case:
-        1- If the user logged in.
-        2- The account is not confirmed.
-        3- The requested URL is outside of the authentication blueprint.
-        4- The requested URL is not for a static file."""
-    if current_user.is_authenticated \
-            and not current_user.confirmed \
-            and request.blueprint != 'auth' \
-            and request.endpoint != 'static':
-        return redirect(url_for('auth.unconfirmed'))
+    """Redirects logged-in users whose account is not confirmed to the
+    unconfirmed page, outside the authentication blueprint and static files.
+
+    Checks run cheapest first and stop at the first that settles the request:
+    the endpoint, the user_free marker of the view, the session (anonymous
+    visitors, and users recorded as confirmed), and only then the user."""
+    if request.endpoint in (None, 'static') or request.blueprint == 'auth':
+        return None
+    if getattr(current_app.view_functions.get(request.endpoint), 'user_free', False):
+        return None
+    user_id = session_user_id()
+    if user_id is None and current_app.config.get('REMEMBER_COOKIE_NAME', COOKIE_NAME) not in request.cookies:
+        return None
+    if user_id is not None and session.get('confirmed') == user_id:
+        return None
+    if current_user.is_authenticated:
+        if not current_user.confirmed:
+            return redirect(url_for('auth.unconfirmed'))
+        remember_confirmed(current_user.get_id())
+    return None
 
 
 # ------------------------------------------------------------------------------
 # Application Authentication Routing:
 # ------------------------------------------------------------------------------
 @auth.route('/login', methods=['GET', 'POST'])
+@rate_limiter.limit('20/minute', remote_address)
+@rate_limiter.limit('5/minute', account)
 def login():
     """loading the user from the database using the email provided with the form.
     If the password is valid, FlaskLogin’s login_user() function is invoked to record
     the user as logged in for the user session."""
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
+        user = User.find_by_email(form.email.data)
         if user and user.verify_password(form.password.data):
+            if db.session.is_modified(user):
+                db.session.commit()
             login_user(user=user, remember=form.remember_me.data)
+            if user.confirmed:
+                remember_confirmed(user.get_id())
             next = request.args.get('next')
             if not is_safe_url(next):
                 return abort(400)
@@ -67,29 +100,56 @@ def login():
 @login_required
 def logout():
     logout_user()
+    session.pop('confirmed', None)
     flash('You have been logged out.')
     return redirect(url_for('main.index'))
 
 
 @auth.route('/register', methods=['GET', 'POST'])
+@rate_limiter.limit('5/minute', remote_address)
 def register():
     form = Registration()
     if form.validate_on_submit():
         # noinspection PyArgumentList
         user = User(email=form.email.data, username=form.username.data, password=form.password.data)
-        db.session.add(user)
-        db.session.commit()
-        token = user.generate_confirmation_token()
-        send_email(subject='Confirm your account',
-                   recipients=user.email,
-                   template_name='auth/email/confirm',
-                   user=user,
-                   token=token)
+        try:
+            db.session.add(user)
+            db.session.flush()
+            token = user.generate_confirmation_token()
+            send_email(subject='Confirm your account',
+                       recipients=user.email,
+                       template_name='auth/email/confirm',
+                       user=user,
+                       token=token)
+            db.session.commit()
+        except IntegrityError as error:
+            db.session.rollback()
+            if not form.unique_violation(error):
+                raise
+            return render_template('auth/register.html', form=form)
+        availability_index().add(form.email.data, form.username.data)
         flash('A confirmation email has been sent to your inbox.')
         return redirect(url_for('main.index'))
     return render_template('auth/register.html', form=form)
 
 
+@auth.route('/available')
+@rate_limiter.limit('30/minute', remote_address, methods=('GET', ))
+def available():
+    """Report whether the email and/or username given in the query string are
+    still free, for live checks in the registration form. Limited per address,
+    as it tells anyone which accounts exist."""
+    index = availability_index()
+    result = {}
+    for field in ('email', 'username'):
+        value = request.args.get(field)
+        if value:
+            result[field] = {'value': value, 'available': index.is_available(field, value)}
+    if not result:
+        return jsonify(error='Pass an email or username.'), 400
+    return jsonify(result)
+
+
 @auth.route('/confirm/<token>')
 @login_required
 def confirm(token):
@@ -98,9 +158,14 @@ def confirm(token):
     added to the session and then the database session is committed."""
     if current_user.confirmed:
         return redirect(url_for('main.index'))
-    if current_user.confirm_generated_token(token):
+    result = current_user.confirm_generated_token(token)
+    if result:
+        user_id = current_user.get_id()
         db.session.commit()
+        remember_confirmed(user_id)
         flash('Thanks! You account has been confirmed.')
+    elif result.status == EXPIRED:
+        flash('The confirmation link has expired.')
     else:
         flash('The confirmation link is invalid or has expired.')
     return redirect(url_for('main.index'))
@@ -123,11 +188,13 @@ def resend_confirmation():
                template_name='auth/email/confirm',
                user=current_user,
                token=token)
+    db.session.commit()
     flash('A confirmation email has been resent to your inbox.')
     return redirect(url_for('main.index'))
 
 
 @auth.route('/change-password', methods=['GET', 'POST'])
+@rate_limiter.limit('5/minute', account)
 @fresh_login_required
 def change_password():
     form = ChangePasswordForm()
@@ -147,12 +214,14 @@ def change_password():
 
 
 @auth.route('/reset', methods=['GET', 'POST'])
+@rate_limiter.limit('5/minute', remote_address)
+@rate_limiter.limit('3/hour', account)
 def password_reset_request():
     form = ResetPasswordRequestForm()
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
     elif form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data.lower()).first()
+        user = User.find_by_email(form.email.data)
         if user:
             token = user.generate_reset_token()
             send_email(subject='Reset Your Password',
@@ -160,6 +229,7 @@ def password_reset_request():
                        template_name='auth/email/reset',
                        user=user,
                        token=token)
+            db.session.commit()
         flash('An email with instructions has been sent to your inbox.')
         return redirect(url_for('main.index'))
     return render_template('auth/reset_password.html', form=form)
@@ -176,5 +246,6 @@ def password_reset(token):
             flash('Your password has been updated.')
             return redirect(url_for('main.index'))
         else:
+            flash('The reset link is invalid or has expired.')
             return redirect(url_for('main.index'))
     return render_template('auth/reset_password.html', form=form)
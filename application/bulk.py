@@ -0,0 +1,148 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Bulk user import and export, run with `flask users import` and
+`flask users export`.
+
+Files are CSV or JSON Lines with the columns email, username, password or
+password_hash, confirmed and role. They are streamed in batches: each batch
+of the import has its plaintext passwords hashed across the hashing pool
+and is inserted with one executemany, and the export fetches the users
+`batch_size` rows at a time, so memory use does not grow with the file.
+"""
+
+import csv
+import json
+import time
+from itertools import islice
+
+from application import db, hasher
+from application.models import Role, User, normalize_email
+
+FIELDS = ('email', 'username', 'password_hash', 'confirmed', 'role')
+TRUE = ('1', 'true', 'yes', 'y', 't')
+
+
+def file_format(filename, format=None):
+    """'csv' or 'jsonl', from `format` or else the file extension."""
+    if format:
+        return format
+    return 'jsonl' if filename.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, format):
+    """Yield the records of a CSV or JSON Lines stream as dicts."""
+    if format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE
+    return bool(value)
+
+
+class RoleCache:
+    """Role ids by name, loaded once per run."""
+
+    def __init__(self):
+        self._ids = dict(db.session.query(Role.name, Role.id))
+
+    def id(self, name):
+        if not name:
+            return None
+        if name not in self._ids:
+            raise ValueError('Unknown role %r.' % name)
+        return self._ids[name]
+
+
+def import_users(rows, batch_size=1000, echo=print):
+    """Insert the users of `rows` in batches, skipping those whose email or
+    username is taken already. Users with neither a password nor a hash are
+    imported without one and cannot log in until they reset it. Returns
+    (imported, skipped)."""
+    roles = RoleCache()
+    table = User.__table__
+    imported = skipped = 0
+    start = time.perf_counter()
+    for batch in batches(rows, batch_size):
+        pending = []
+        for row in batch:
+            if not row.get('email') or not row.get('username'):
+                raise ValueError('Every user needs an email and a username: %r' % row)
+            record = dict(email=row['email'],
+                          email_normalized=normalize_email(row['email']),
+                          username=row['username'],
+                          password_hash=row.get('password_hash') or None,
+                          confirmed=as_bool(row.get('confirmed')),
+                          role_id=roles.id(row.get('role')))
+            pending.append((record, row.get('password')))
+        pending = unique(pending)
+        skipped += len(batch) - len(pending)
+        plaintext = [(record, password) for record, password in pending if not record['password_hash'] and password]
+        hashes = hasher.generate_many(password for record, password in plaintext)
+        for (record, password), password_hash in zip(plaintext, hashes):
+            record['password_hash'] = password_hash
+        if pending:
+            db.session.execute(table.insert(), [record for record, password in pending])
+        db.session.commit()
+        imported += len(pending)
+        echo('Imported %d users, skipped %d (%.0f users/s).' % (imported, skipped,
+                                                                imported / (time.perf_counter() - start)))
+    return imported, skipped
+
+
+def unique(pending):
+    """Drop the (record, password) pairs whose email or username is taken,
+    in the database or earlier in the batch."""
+    emails = {record['email_normalized'] for record, password in pending}
+    usernames = {record['username'] for record, password in pending}
+    taken_emails, taken_usernames = set(), set()
+    query = db.session.query(User.email_normalized, User.username) \
+        .filter(db.or_(User.email_normalized.in_(emails), User.username.in_(usernames)))
+    for email, username in query:
+        taken_emails.add(email)
+        taken_usernames.add(username)
+    kept = []
+    for record, password in pending:
+        if record['email_normalized'] in taken_emails or record['username'] in taken_usernames:
+            continue
+        taken_emails.add(record['email_normalized'])
+        taken_usernames.add(record['username'])
+        kept.append((record, password))
+    return kept
+
+
+def export_users(stream, format, batch_size=1000, echo=print):
+    """Write every user to `stream`, fetching `batch_size` rows at a time.
+    Returns the number written."""
+    query = db.session.query(User.email, User.username, User.password_hash, User.confirmed, Role.name) \
+        .outerjoin(Role, User.role_id == Role.id).order_by(User.id).yield_per(batch_size)
+    writer = csv.writer(stream) if format == 'csv' else None
+    if writer:
+        writer.writerow(FIELDS)
+    count = 0
+    start = time.perf_counter()
+    for row in query:
+        if writer:
+            writer.writerow(row)
+        else:
+            stream.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+        count += 1
+        if count % batch_size == 0:
+            echo('Exported %d users (%.0f users/s).' % (count, count / (time.perf_counter() - start)))
+    echo('Exported %d users in %.2fs.' % (count, time.perf_counter() - start))
+    return count
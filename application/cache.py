@@ -0,0 +1,125 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""In-process and shared caches."""
+
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock, local
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU mapping whose entries expire after ttl
+    seconds (never, if ttl is None). Counts hits, misses and evictions."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return dict(size=len(self._data), hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class SQLiteCache:
+    """Cache of picklable values in an SQLite file, shared by every process
+    that opens the same path. Entries expire after ttl seconds (never, if ttl
+    is None); expired rows are purged as new ones are written."""
+
+    def __init__(self, path, ttl=None, timeout=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._local = local()
+        with self._connection as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS cache '
+                               '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode = WAL')
+        return connection
+
+    def get(self, key, default=None):
+        row = self._connection.execute('SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                                       (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        expires = None if self.ttl is None else now + self.ttl
+        with self._connection as connection:
+            connection.execute('DELETE FROM cache WHERE expires <= ?', (now, ))
+            connection.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                               (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires))
+
+    def delete(self, key):
+        with self._connection as connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key, ))
+
+    def clear(self):
+        with self._connection as connection:
+            connection.execute('DELETE FROM cache')
+
+    def stats(self):
+        size = self._connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        return dict(size=size, hits=self.hits, misses=self.misses)
+
+    def __len__(self):
+        return self.stats()['size']
+
+    def __contains__(self, key):
+        row = self._connection.execute('SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                                       (key, time.time())).fetchone()
+        return row is not None
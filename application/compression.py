@@ -0,0 +1,156 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""WSGI middleware compressing responses with brotli or gzip as they stream."""
+
+import re
+import zlib
+
+from flask import current_app, g
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip is offered without it
+    brotli = None
+
+SUFFIXES = {'br': '-br', 'gzip': '-gzip'}
+ETAG_SUFFIX = re.compile(r'(-br|-gzip)(?=")')
+
+
+class GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+STREAMS = {'br': BrotliStream, 'gzip': GzipStream}
+
+
+class CompressionMiddleware:
+    """Compresses responses of the allowed content types whose length is
+    unknown or at least `minimum_size`, in the best encoding the client
+    accepts. Each chunk is flushed as it is produced, so streamed bodies are
+    never buffered. Responses that already have a Content-Encoding (such as
+    precompressed static files), ranges, HEAD requests and
+    Cache-Control: no-transform pass through, and so do Cache-Control: private
+    ones unless `compress_private`: compressing a secret next to reflected
+    input lets an attacker recover it from the compressed sizes (BREACH).
+
+    A compressed response's ETag gets an encoding suffix ("abc" becomes
+    "abc-gzip"), and the suffix is removed from If-None-Match and If-Match
+    before the application sees them, so its conditional responses keep
+    working."""
+
+    def __init__(self, app, minimum_size=500, mimetypes=('text/html', ), level=6, compress_private=False):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.mimetypes = set(mimetypes)
+        self.level = level
+        self.compress_private = compress_private
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip', )
+
+    def negotiate(self, environ):
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        best = max(self.encodings, key=lambda encoding: accepted[encoding])
+        return best if accepted[best] > 0 else None
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate(environ)
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD':
+            return self.app(environ, start_response)
+        revalidating = False
+        for name in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH'):
+            if name in environ:
+                environ[name], replaced = ETAG_SUFFIX.subn('', environ[name])
+                revalidating = revalidating or bool(replaced)
+        state = {}
+
+        def start(status, headers, exc_info=None):
+            state['started'] = True
+            headers = Headers(headers)
+            if self.compressible(status, headers):
+                state['stream'] = STREAMS[encoding](self.level)
+                headers.remove('Content-Length')
+                headers['Content-Encoding'] = encoding
+                self.add_etag_suffix(headers, encoding)
+            elif status.startswith('304') and revalidating:
+                self.add_etag_suffix(headers, encoding)
+            if headers.get('Content-Type', '').split(';')[0].strip() in self.mimetypes:
+                vary = headers.get('Vary')
+                if not vary or 'accept-encoding' not in vary.lower():
+                    headers['Vary'] = vary + ', Accept-Encoding' if vary else 'Accept-Encoding'
+            write = start_response(status, headers.to_wsgi_list(), exc_info)
+            stream = state.get('stream')
+            return write if stream is None else lambda data: write(stream.compress(data))
+
+        app_iter = self.app(environ, start)
+        if state.get('started') and 'stream' not in state:
+            return app_iter  # Passed through untouched, keeping wsgi.file_wrapper
+        return self.stream(app_iter, state)
+
+    def compressible(self, status, headers):
+        if not status.startswith('200') or 'Content-Encoding' in headers or 'Content-Range' in headers:
+            return False
+        cache_control = headers.get('Cache-Control', '')
+        if 'no-transform' in cache_control or ('private' in cache_control and not self.compress_private):
+            return False
+        if headers.get('Content-Type', '').split(';')[0].strip() not in self.mimetypes:
+            return False
+        length = headers.get('Content-Length')
+        return length is None or int(length) >= self.minimum_size
+
+    @staticmethod
+    def add_etag_suffix(headers, encoding):
+        etag = headers.get('ETag')
+        if etag and etag.endswith('"'):
+            headers['ETag'] = etag[:-1] + SUFFIXES[encoding] + '"'
+
+    @staticmethod
+    def stream(app_iter, state):
+        try:
+            for chunk in app_iter:
+                stream = state.get('stream')
+                if stream is None:
+                    yield chunk
+                elif chunk:
+                    yield stream.compress(chunk)
+            if state.get('stream') is not None:
+                yield state['stream'].finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+
+def mark_private(response):
+    """Mark responses that rendered a CSRF token Cache-Control: private."""
+    if current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token') in g:
+        response.cache_control.private = True
+    return response
+
+
+def configure_compression(app):
+    """Compress the application's responses as APP_COMPRESSION_* configure.
+    Pages with a CSRF token are marked private and left uncompressed, unless
+    APP_COMPRESSION_PRIVATE accepts the BREACH exposure."""
+    app.after_request(mark_private)
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config['APP_COMPRESSION_MIN_SIZE'],
+                                         app.config['APP_COMPRESSION_MIMETYPES'], app.config['APP_COMPRESSION_LEVEL'],
+                                         app.config['APP_COMPRESSION_PRIVATE'])
@@ -2,29 +2,352 @@
 #  Copyright (c) 2020. Anas Abu Farraj.
 # ------------------------------------------------------------------------------
 
-from threading import Thread
-from flask import current_app, render_template
-from flask_mail import Message
-from application import mail
+import atexit
+import json
+import queue
+import smtplib
+import time
+import uuid
+from concurrent.futures import Future, wait
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+from flask import current_app, render_template, request, has_request_context
+from sqlalchemy import and_, or_
+from application import db, mail
+from application.models import Outbox, User
+from application.tokens import CONFIRM, generate_token
+
+_STOP = object()
 
 
 # ------------------------------------------------------------------------------
-# Asynchronous Email Sending Setup:
+# Pooled Email Dispatcher Setup:
 # ------------------------------------------------------------------------------
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+class MailDispatcher:
+    """Fixed-size pool of mail workers fed by a bounded queue.
+
+    Each worker keeps its SMTP connection open between messages and closes it
+    after MAIL_IDLE_TIMEOUT seconds without work. When the queue is full,
+    submit() blocks up to MAIL_QUEUE_TIMEOUT seconds and then raises queue.Full.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._workers = []
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._queue = queue.Queue(maxsize=app.config['MAIL_QUEUE_SIZE'])
+        app.extensions['mail_dispatcher'] = self
+
+    @property
+    def running(self):
+        return bool(self._workers)
+
+    def start(self):
+        """Start the worker threads, once."""
+        with self._lock:
+            if self._workers:
+                return
+            for number in range(self.app.config['MAIL_WORKERS']):
+                worker = Thread(target=self._work, name='mail-worker-%d' % number, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            atexit.register(self.shutdown)
+
+    def submit(self, msg, timeout=None):
+        """Queue a message for delivery, blocking while the queue is full.
+        Returns a Future that is resolved once the message is sent, or holds
+        the exception it failed with."""
+        if not self._workers:
+            self.start()
+        if timeout is None:
+            timeout = self.app.config['MAIL_QUEUE_TIMEOUT']
+        future = Future()
+        self._queue.put((msg, future), timeout=timeout)
+        return future
+
+    def join(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def shutdown(self, timeout=None):
+        """Drain the queue, then stop the workers and close their connections.
+        Gives up after `timeout` seconds (default MAIL_QUEUE_TIMEOUT) if the
+        queue stays full, rather than block the exiting process."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            alive = [worker for worker in workers if worker.is_alive()]
+            put_timeout = self.app.config['MAIL_QUEUE_TIMEOUT'] if timeout is None else timeout
+            for _ in alive:
+                try:
+                    self._queue.put(_STOP, timeout=put_timeout)
+                except queue.Full:
+                    self.app.logger.warning('Mail queue still full at shutdown; unsent emails are dropped')
+                    break
+            for worker in alive:
+                worker.join(timeout)
+
+    def _work(self):
+        idle_timeout = self.app.config['MAIL_IDLE_TIMEOUT']
+        connection = None
+        with self.app.app_context():
+            while True:
+                try:
+                    item = self._queue.get(timeout=idle_timeout)
+                except queue.Empty:
+                    connection = self._close(connection)
+                    continue
+                try:
+                    if item is _STOP:
+                        break
+                    msg, future = item
+                    try:
+                        connection = self._deliver(connection, msg)
+                    except Exception as error:  # Such as a refused recipient or bad headers
+                        self.app.logger.exception('Mail to %s failed', msg.recipients)
+                        connection = self._close(connection)
+                        future.set_exception(error)
+                    else:
+                        future.set_result(msg)
+                finally:
+                    self._queue.task_done()
+            self._close(connection)
+
+    def _deliver(self, connection, msg):
+        """Send one message, reconnecting once if the kept-alive connection was
+        dropped by the server. Returns the connection to reuse."""
+        for attempt in (1, 2):
+            try:
+                if connection is None:
+                    connection = mail.connect().__enter__()
+                connection.send(msg)
+                return connection
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                connection = self._close(connection)
+                if attempt == 2:
+                    raise
+
+    @staticmethod
+    def _close(connection):
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+        return None
+
+
+# ------------------------------------------------------------------------------
+# Email Outbox Setup:
+# ------------------------------------------------------------------------------
+def dump_context(kwargs):
+    """Serialize template arguments for the outbox. Model instances are stored
+    by class name and primary key and loaded again at delivery time."""
+    context = {}
+    for name, value in kwargs.items():
+        value = getattr(value, '_get_current_object', lambda: value)()
+        if isinstance(value, db.Model):
+            value = {'__model__': type(value).__name__, 'id': value.id}
+        context[name] = value
+    if has_request_context():
+        context['__base_url__'] = request.url_root
+    return json.dumps(context)
+
+
+def load_context(context):
+    """Reverse dump_context(), returning the base URL and template arguments."""
+    kwargs = json.loads(context)
+    base_url = kwargs.pop('__base_url__', None)
+    for name, value in kwargs.items():
+        if isinstance(value, dict) and '__model__' in value:
+            model = db.Model._decl_class_registry[value['__model__']]
+            kwargs[name] = model.query.get(value['id'])
+    return base_url, kwargs
+
+
+def make_message(subject, recipients, body, html):
+    from flask_mail import Message  # Imported with Flask-Mail on first use
+    config = current_app.config
+    msg = Message(subject=config['APP_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
+                  sender=config['APP_MAIL_SENDER'],
+                  recipients=[recipients])
+    msg.body = body
+    msg.html = html
+    return msg
+
 
+def build_message(subject, recipients, template_name, **kwargs):
+    return make_message(subject, recipients, render_template(template_name + '.txt', **kwargs),
+                        render_template(template_name + '.html', **kwargs))
 
+
+def claim_outbox(batch_size):
+    """Claim up to batch_size due rows for this worker. Rows left in 'sending'
+    longer than APP_MAIL_OUTBOX_LEASE seconds are claimed again, so a crashed
+    worker delays its emails but never loses them."""
+    now = datetime.utcnow()
+    lease_expired = now - timedelta(seconds=current_app.config['APP_MAIL_OUTBOX_LEASE'])
+    claimable = or_(and_(Outbox.status == 'pending', Outbox.next_attempt_at <= now),
+                    and_(Outbox.status == 'sending', Outbox.claimed_at < lease_expired))
+    ids = [row.id for row in db.session.query(Outbox.id).filter(claimable).order_by(Outbox.id).limit(batch_size)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    Outbox.query.filter(Outbox.id.in_(ids), claimable) \
+        .update({'status': 'sending', 'claim_token': token, 'claimed_at': now}, synchronize_session=False)
+    db.session.commit()
+    return Outbox.query.filter_by(claim_token=token).order_by(Outbox.id).all()
+
+
+def record_failure(row, error):
+    """Schedule a retry with exponential backoff, or give up after
+    APP_MAIL_OUTBOX_MAX_ATTEMPTS."""
+    config = current_app.config
+    row.attempts = (row.attempts or 0) + 1
+    row.last_error = str(error)
+    row.claim_token = None
+    if row.attempts >= config['APP_MAIL_OUTBOX_MAX_ATTEMPTS']:
+        row.status = 'failed'
+    else:
+        delay = config['APP_MAIL_OUTBOX_BACKOFF'] * 2**(row.attempts - 1)
+        row.status = 'pending'
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def deliver_outbox(batch_size=50):
+    """Claim one batch from the outbox and send it over a single SMTP session.
+    A row that cannot be rendered or sent is scheduled for a retry on its own;
+    losing the connection schedules the rest of the batch. Each row's outcome
+    is committed as soon as it is known. Returns the number of rows claimed."""
+    app = current_app._get_current_object()
+    rows = claim_outbox(batch_size)
+    if not rows:
+        return 0
+    pending = list(rows)
+    try:
+        with mail.connect() as connection:
+            while pending:
+                row = pending[0]
+                try:
+                    base_url, kwargs = load_context(row.context)
+                    with app.test_request_context(base_url=base_url or '/'):
+                        msg = build_message(row.subject, row.recipient, row.template_name, **kwargs)
+                    connection.send(msg)
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    raise
+                except Exception as error:  # This row only: refused addresses or data, bad headers or templates
+                    app.logger.warning('Outbox email %s failed: %s', row.id, error)
+                    record_failure(row, error)
+                else:
+                    row.status = 'sent'
+                    row.sent_at = datetime.utcnow()
+                    row.claim_token = None
+                pending.pop(0)
+                db.session.commit()
+    except (smtplib.SMTPException, OSError) as error:
+        app.logger.warning('Outbox delivery interrupted: %s', error)
+        for row in pending:
+            record_failure(row, error)
+    db.session.commit()
+    return len(rows)
+
+
+# ------------------------------------------------------------------------------
+# Asynchronous Email Sending Setup:
+# ------------------------------------------------------------------------------
 def send_email(subject, recipients, template_name, **kwargs):
+    """Queue an email. With APP_MAIL_OUTBOX the email is added to the current
+    database session and is only sent once the caller commits; otherwise it is
+    rendered now and handed to the mail dispatcher."""
     app = current_app._get_current_object()
-    msg = Message(subject=app.config['APP_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
-                  sender=app.config['APP_MAIL_SENDER'],
-                  recipients=[recipients])
-    # TODO: Remove the assertion when finish testing
-    assert msg.sender == 'Admin <goyoomed@gmail.com>'
-    msg.body = render_template(template_name + '.txt', **kwargs)
-    msg.html = render_template(template_name + '.html', **kwargs)
-    thread = Thread(target=send_async_email, args=[app, msg])
-    thread.start()
-    return thread
+    if app.config['APP_MAIL_OUTBOX']:
+        row = Outbox(subject=subject,
+                     recipient=recipients,
+                     template_name=template_name,
+                     context=dump_context(kwargs))
+        db.session.add(row)
+        return row
+    msg = build_message(subject, recipients, template_name, **kwargs)
+    app.extensions['mail_dispatcher'].submit(msg)
+    return msg
+
+
+# ------------------------------------------------------------------------------
+# Confirmation Campaign:
+# ------------------------------------------------------------------------------
+def unconfirmed_users(after_id=0, batch_size=500):
+    """Yield batches of (id, email, username) rows of the unconfirmed users,
+    paging on the primary key so that every batch is an index range scan."""
+    unconfirmed = or_(User.confirmed == False, User.confirmed.is_(None))  # noqa: E712
+    while True:
+        batch = db.session.query(User.id, User.email, User.username) \
+            .filter(unconfirmed, User.id > after_id).order_by(User.id).limit(batch_size).all()
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1].id
+
+
+class CampaignInterrupted(Exception):
+    """A campaign email was not delivered. `after_id` is the last user id
+    before it, from which the campaign can be resumed."""
+
+    def __init__(self, sent, after_id, user_id, error):
+        super().__init__('Delivery to user %d failed: %s' % (user_id, str(error) or type(error).__name__))
+        self.sent = sent
+        self.after_id = after_id
+        self.user_id = user_id
+        self.error = error
+
+
+def resend_confirmations(base_url, after_id=0, batch_size=500, rate=10.0, dry_run=False, echo=print):
+    """Send a new confirmation email to every unconfirmed user with an id
+    above `after_id`, at most `rate` per second (0: unlimited).
+
+    The templates are compiled once and the messages go through the mail
+    dispatcher, whose MAIL_WORKERS keep their SMTP connections open. Each
+    batch is delivered before the next is read, so the id reported after it
+    can be passed as `after_id` to resume. If an email is not delivered,
+    CampaignInterrupted is raised with the id to resume from. With `dry_run`
+    the messages are rendered but not sent. Returns (messages, last id)."""
+    app = current_app._get_current_object()
+    dispatcher = app.extensions['mail_dispatcher']
+    text = app.jinja_env.get_template('auth/email/confirm.txt')
+    html = app.jinja_env.get_template('auth/email/confirm.html')
+    sent = 0
+    start = next_at = time.perf_counter()
+    with app.test_request_context(base_url=base_url):
+        for batch in unconfirmed_users(after_id, batch_size):
+            futures = []
+            for user in batch:
+                context = dict(user=user, token=generate_token(CONFIRM, user.id))
+                msg = make_message('Confirm your account', user.email, text.render(context), html.render(context))
+                if dry_run:
+                    sent += 1
+                    continue
+                if rate:
+                    time.sleep(max(0.0, next_at - time.perf_counter()))
+                    next_at = max(next_at, time.perf_counter() - 1) + 1 / rate
+                try:
+                    futures.append((user.id, dispatcher.submit(msg)))
+                except queue.Full as error:  # Reported below, once the messages already queued are settled
+                    futures.append((user.id, Future()))
+                    futures[-1][1].set_exception(error)
+                    break
+            wait([future for user_id, future in futures])
+            for user_id, future in futures:
+                if future.exception() is not None:
+                    db.session.rollback()
+                    raise CampaignInterrupted(sent, after_id, user_id, future.exception())
+                sent += 1
+                after_id = user_id
+            after_id = batch[-1].id
+            echo('%s %d emails through user %d (%.1f/s).' % ('Rendered' if dry_run else 'Sent', sent, after_id,
+                                                              sent / (time.perf_counter() - start)))
+            db.session.rollback()  # End the read transaction between batches
+    return sent, after_id
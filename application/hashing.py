@@ -0,0 +1,108 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Password hashing service."""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from threading import Lock
+
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+DEFAULT_METHOD = 'pbkdf2:sha256'
+DEFAULT_SALT_LENGTH = 8
+
+
+def normalize_method(method):
+    """Return the method name Werkzeug records in the hash, e.g.
+    'pbkdf2:sha256' becomes 'pbkdf2:sha256:150000'."""
+    if method.startswith('pbkdf2:') and method.count(':') == 1:
+        return '%s:%d' % (method, DEFAULT_PBKDF2_ITERATIONS)
+    return method
+
+
+class PasswordHasher:
+    """Runs Werkzeug's password hashing in a process pool, so the deliberately
+    slow key derivation does not hold the GIL of the request threads.
+
+    The method, salt length and pool size are read from APP_PASSWORD_HASH_METHOD,
+    APP_PASSWORD_SALT_LENGTH and APP_PASSWORD_HASH_WORKERS; a pool size of 0
+    hashes on the calling thread. Outside an application context the
+    Werkzeug defaults are used inline.
+    """
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('APP_PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        app.config.setdefault('APP_PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+        app.config.setdefault('APP_PASSWORD_HASH_WORKERS', None)
+        app.extensions['password_hasher'] = self
+
+    @staticmethod
+    def _settings():
+        if not has_app_context():
+            return DEFAULT_METHOD, DEFAULT_SALT_LENGTH, 0
+        config = current_app.config
+        workers = config['APP_PASSWORD_HASH_WORKERS']
+        return (config['APP_PASSWORD_HASH_METHOD'], config['APP_PASSWORD_SALT_LENGTH'],
+                os.cpu_count() if workers is None else workers)
+
+    def executor(self, workers):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+            return self._executor
+
+    def _run(self, workers, function, *args):
+        start = time.perf_counter()
+        try:
+            if not workers:
+                return function(*args)
+            return self.executor(workers).submit(function, *args).result()
+        finally:
+            registry = current_app.extensions.get('metrics') if has_app_context() else None
+            if registry is not None:
+                registry.observe('password_hash_duration_seconds',
+                                 time.perf_counter() - start,
+                                 operation=function.__name__)
+
+    def generate(self, password):
+        method, salt_length, workers = self._settings()
+        return self._run(workers, generate_password_hash, password, method, salt_length)
+
+    def generate_many(self, passwords):
+        """Hash a batch of passwords, spread across the whole pool."""
+        method, salt_length, workers = self._settings()
+        passwords = list(passwords)
+        if not workers:
+            return [generate_password_hash(password, method, salt_length) for password in passwords]
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(self.executor(workers).map(generate_password_hash, passwords, repeat(method),
+                                               repeat(salt_length), chunksize=chunksize))
+
+    def check(self, password_hash, password):
+        workers = self._settings()[2]
+        return self._run(workers, check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the hash was made with another method, cost or salt length
+        than the configured ones."""
+        method, salt_length = self._settings()[:2]
+        if not password_hash or password_hash.count('$') < 2:
+            return True
+        stored_method, salt = password_hash.split('$', 2)[:2]
+        return stored_method != normalize_method(method) or len(salt) != salt_length
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,97 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Extensions imported and initialized on first use.
+
+A worker serving JSON, or a `flask db upgrade`, never needs Flask-Moment or
+Flask-Mail, yet importing them is a noticeable share of the start-up time
+(Flask-Moment alone pulls in pkg_resources). LazyExtension stands in for such
+an extension: with APP_LAZY_EXTENSIONS, init_app only records the app, and
+the module is imported and the real init_app run the first time the
+extension is used there.
+"""
+
+import sys
+import weakref
+from importlib import import_module
+from threading import RLock
+
+from flask import current_app
+
+
+class LazyExtension:
+    """Proxy for `module.name()`, a Flask extension. Attribute access is
+    delegated to the extension, initialized on the current app if it was not
+    yet. With `template_global`, templates can use `app.extensions[
+    template_global]` under that name before the extension is initialized."""
+
+    def __init__(self, module, name, template_global=None):
+        self._module = module
+        self._name = name
+        self._template_global = template_global
+        self._extension = None
+        self._apps = weakref.WeakSet()
+        self._lock = RLock()
+
+    @property
+    def loaded(self):
+        return self._extension is not None
+
+    @property
+    def extension(self):
+        """The extension instance, importing its module if needed."""
+        if self._extension is None:
+            with self._lock:
+                if self._extension is None:
+                    self._extension = getattr(import_module(self._module), self._name)()
+        return self._extension
+
+    def init_app(self, app):
+        """Initialize now when laziness is off or the module is imported
+        anyway, otherwise on first use. Calling it again re-reads the
+        configuration."""
+        self._apps.discard(app)
+        if not app.config.get('APP_LAZY_EXTENSIONS') or self._module in sys.modules:
+            self._initialize(app)
+        elif self._template_global:
+            app.jinja_env.globals[self._template_global] = _TemplateGlobal(self, app)
+
+    def _initialize(self, app):
+        with self._lock:
+            if app not in self._apps:
+                self.extension.init_app(app)
+                self._apps.add(app)
+
+    def get(self, app=None):
+        """The extension, initialized on `app` or the current app."""
+        app = app or current_app._get_current_object()
+        if app not in self._apps:
+            self._initialize(app)
+        return self.extension
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class _TemplateGlobal:
+    """What an extension's context processor would provide, resolved when a
+    template first uses it."""
+
+    def __init__(self, lazy, app):
+        self._lazy = lazy
+        self._app = weakref.ref(app)
+
+    def _target(self):
+        app = self._app()
+        self._lazy.get(app)
+        return app.extensions[self._lazy._template_global]
+
+    def __call__(self, *args, **kwargs):
+        return self._target()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._target(), name)
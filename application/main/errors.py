@@ -3,13 +3,15 @@
 # ------------------------------------------------------------------------------
 """Application-wide errors handlers."""
 
-from flask import render_template
+from flask import make_response, render_template
 from flask_wtf.csrf import CSRFError
 
+from application import page_cache
 from application.main import main
 
 
 @main.app_errorhandler(404)
+@page_cache.cached(key=lambda error: error.description)
 def page_not_found(error):
     return render_template('errors/404.html', reason=error.description), 404
 
@@ -20,10 +22,19 @@ def internal_server_error(error):
 
 
 @main.app_errorhandler(400)
+@page_cache.cached(key=lambda error: error.description)
 def bad_request(error):
     return render_template('errors/400.html', reason=error.description), 400
 
 
+@main.app_errorhandler(429)
+def too_many_requests(error):
+    response = make_response(render_template('errors/429.html', reason=error.description), 429)
+    if getattr(error, 'retry_after', None):
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
 @main.app_errorhandler(CSRFError)
 def csrf_error(error):
     """Returns error template CSRF Error."""
@@ -4,6 +4,7 @@
 
 from flask import render_template
 
+from application import page_cache
 from application.main import main
 
 
@@ -11,5 +12,6 @@ from application.main import main
 # Application Main Routing:
 # ------------------------------------------------------------------------------
 @main.route('/')
+@page_cache.cached()
 def index():
     return render_template('index.html')
@@ -0,0 +1,222 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Request instrumentation served in the Prometheus text format."""
+
+import bisect
+import threading
+import time
+import weakref
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statements that only manage transactions; they are not counted as queries.
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.'),
+    'http_requests_total': ('counter', 'Requests by endpoint and status code.'),
+    'db_statements_total': ('counter', 'SQL statements executed by endpoint.'),
+    'db_duration_seconds': ('histogram', 'Time spent in SQL per request by endpoint.'),
+    'template_render_duration_seconds': ('histogram', 'Template rendering time by template.'),
+    'password_hash_duration_seconds': ('histogram', 'Password hashing time by operation.'),
+    'rate_limited_total': ('counter', 'Requests rejected by a rate limit, by endpoint and key.'),
+}
+
+
+class _Buffer:
+    """Metrics recorded by a single thread."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    """Counters and histograms, recorded into per-thread buffers so that
+    recording takes no lock. Rendering merges every buffer; the buffers of
+    threads that have exited are folded into a retired one."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        self._buffers = []  # (weak reference to the owning thread, buffer)
+        self._retired = _Buffer()
+        self._lock = threading.Lock()
+
+    @property
+    def _buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = _Buffer()
+            with self._lock:
+                self._buffers.append((weakref.ref(threading.current_thread()), buffer))
+        return buffer
+
+    def inc(self, name, value=1, **labels):
+        counters = self._buffer.counters
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        histograms = self._buffer.histograms
+        key = (name, tuple(sorted(labels.items())))
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(self.buckets) + 2)  # buckets, +Inf, sum
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def collect(self):
+        """Merge the thread buffers into (counters, histograms)."""
+        with self._lock:
+            live = []
+            for owner, buffer in self._buffers:
+                thread = owner()
+                if thread is not None and thread.is_alive():
+                    live.append((owner, buffer))
+                else:  # No more writes to it
+                    _merge(self._retired.counters, self._retired.histograms, buffer)
+            self._buffers = live
+            counters, histograms = {}, {}
+            _merge(counters, histograms, self._retired)
+        for owner, buffer in live:
+            _merge(counters, histograms, buffer)
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name in sorted({key[0] for key in counters} | {key[0] for key in histograms}):
+            kind, description = HELP.get(name, ('untyped', name))
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append('%s%s %s' % (name, _labels(labels), _number(value)))
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf', ), values):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name, _labels(labels + (('le', _number(bound)), )), cumulative))
+                lines.append('%s_sum%s %s' % (name, _labels(labels), _number(values[-1])))
+                lines.append('%s_count%s %d' % (name, _labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+def _merge(counters, histograms, buffer):
+    """Add a buffer's values to counters and histograms. The buffer may be
+    written to concurrently by its thread."""
+    for key, value in buffer.counters.copy().items():
+        counters[key] = counters.get(key, 0) + value
+    for key, values in buffer.histograms.copy().items():
+        merged = histograms.setdefault(key, [0] * len(values))
+        for index, value in enumerate(list(values)):
+            merged[index] += value
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for key, value in labels)
+
+
+def _number(value):
+    return value if isinstance(value, str) else repr(value)
+
+
+def current_registry():
+    """Return the current application's registry, or None when disabled."""
+    if has_app_context():
+        return current_app.extensions.get('metrics')
+    return None
+
+
+# ------------------------------------------------------------------------------
+# SQL Statement Counting:
+# ------------------------------------------------------------------------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+    if has_request_context() and 'metrics_start' in g and not statement.startswith(TRANSACTION_CONTROL):
+        g.metrics_db_statements += 1
+        g.metrics_db_seconds += elapsed
+
+
+# ------------------------------------------------------------------------------
+# Flask Extension:
+# ------------------------------------------------------------------------------
+class Metrics:
+    """Records per-endpoint latency and status codes, SQL statement counts and
+    time per request, template rendering and password hashing, and serves them
+    at /metrics. Enabled by APP_METRICS_ENABLED."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('APP_METRICS_ENABLED', True)
+        if not app.config['APP_METRICS_ENABLED']:
+            return
+        app.extensions['metrics'] = MetricsRegistry()
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+        before_render_template.connect(self._start_render, app)
+        template_rendered.connect(self._finish_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    @staticmethod
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_db_statements = 0
+        g.metrics_db_seconds = 0.0
+
+    @staticmethod
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @staticmethod
+    def _finish_request(error=None):
+        if 'metrics_start' not in g:
+            return
+        registry = current_app.extensions['metrics']
+        endpoint = request.endpoint or 'none'
+        status = 500 if error is not None else g.get('metrics_status', 500)
+        registry.observe('http_request_duration_seconds', time.perf_counter() - g.metrics_start, endpoint=endpoint)
+        registry.inc('http_requests_total', endpoint=endpoint, status=status)
+        registry.inc('db_statements_total', g.metrics_db_statements, endpoint=endpoint)
+        registry.observe('db_duration_seconds', g.metrics_db_seconds, endpoint=endpoint)
+        g.pop('metrics_start')
+
+    @staticmethod
+    def _start_render(app, template, context, **extra):
+        g.setdefault('metrics_render_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _finish_render(app, template, context, **extra):
+        starts = g.get('metrics_render_start')
+        if starts:
+            app.extensions['metrics'].observe('template_render_duration_seconds',
+                                              time.perf_counter() - starts.pop(),
+                                              template=template.name)
+
+    @staticmethod
+    def export():
+        return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
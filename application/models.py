@@ -2,13 +2,22 @@
 #  Copyright (c) 2020. Anas Abu Farraj.
 # ------------------------------------------------------------------------------
 
+from datetime import datetime
+
 from flask import current_app
 from flask_login import UserMixin
-from itsdangerous import TimedJSONWebSignatureSerializer as Serializer, SignatureExpired
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import make_transient_to_detached, object_session
 
 from application import db
+from application import hasher
 from application import login_manager
+from application.cache import LRUCache
+from application.tokens import CONFIRM, RESET, INVALID, TokenResult, generate_token, verify_token
+
+
+def normalize_email(email):
+    """Return the form of an email address used for lookups and uniqueness."""
+    return email.strip().lower() if email else email
 
 
 # ------------------------------------------------------------------------------
@@ -30,10 +39,23 @@ class User(UserMixin, db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(64), unique=True, index=True)
+    email_normalized = db.Column(db.String(64), unique=True, index=True)
     username = db.Column(db.String(64), unique=True, index=True)
     password_hash = db.Column(db.String(128))
     confirmed = db.Column(db.Boolean, default=False)
     role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @db.validates('email')
+    def normalize_email_column(self, key, email):
+        """Keep email_normalized in step with email; all lookups use it."""
+        self.email_normalized = normalize_email(email)
+        return email
+
+    @staticmethod
+    def find_by_email(email):
+        """Case-insensitive lookup served by ix_users_email_normalized."""
+        return User.query.filter_by(email_normalized=normalize_email(email)).first()
 
     @property
     def password(self):
@@ -43,62 +65,173 @@ class User(UserMixin, db.Model):
 
     @password.setter
     def password(self, password):
-        """When the password property is set, the setter method will call Werkzeug’s
-        generate_password_hash() function and write the result to the password_hash
-        field."""
-        self.password_hash = generate_password_hash(password)
+        """When the password property is set, the setter method will hash it with
+        Werkzeug’s generate_password_hash() in the hashing pool and write the result
+        to the password_hash field."""
+        self.password_hash = hasher.generate(password)
 
     def verify_password(self, password):
-        """Check password with password hash, return True if matches."""
-        return check_password_hash(self.password_hash, password)
+        """Check password with password hash, return True if matches. A matching
+        password stored with outdated hash parameters is hashed again; the caller
+        commits the change. A user without a password, such as one imported
+        without any, never matches."""
+        if not self.password_hash or not hasher.check(self.password_hash, password):
+            return False
+        if hasher.needs_rehash(self.password_hash):
+            self.password = password
+        return True
 
     def generate_confirmation_token(self, expiration=3600):
         """Returns confirmation token."""
-        serializer = Serializer(current_app.config['SECRET_KEY'], expires_in=expiration)
-        return serializer.dumps({'confirm': self.id}).decode('utf-8')
+        return generate_token(CONFIRM, self.id, expiration)
 
     def confirm_generated_token(self, token):
-        """Try to deserialize the previously generated token, if the token expired,
-        raise a SignalExpired exception, usually a message; 'The confirmation link is
-        invalid or has expired'."""
-        serializer = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = serializer.loads(token.encode('utf-8'))
-        except SignatureExpired:
-            return False
-        if data.get('confirm') != self.id:
-            return False
+        """Verify a confirmation token and mark the user confirmed. Returns a
+        TokenResult, which is falsy when the token is expired, invalid or was
+        issued for another user; the view usually flashes 'The confirmation
+        link is invalid or has expired'."""
+        result = verify_token(CONFIRM, token)
+        if not result:
+            return result
+        if result.user_id != self.id:
+            return TokenResult(INVALID, result.user_id)
         self.confirmed = True
         db.session.add(self)
-        return True
+        return result
 
     def generate_reset_token(self, expiration=3600):
-        serializer = Serializer(current_app.config['SECRET_KEY'], expiration)
-        return serializer.dumps({'reset': self.id}).decode('utf-8')
+        return generate_token(RESET, self.id, expiration)
 
     @staticmethod
     def reset_password(token, new_password):
-        serializer = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = serializer.loads(token.encode('utf-8'))
-        except SignatureExpired:
-            return False
-        user = User.query.get(data.get('reset'))
+        """Verify a reset token before loading the user, then set the new
+        password. Returns a TokenResult."""
+        result = verify_token(RESET, token)
+        if not result:
+            return result
+        user = User.query.get(result.user_id)
         if not user:
-            return False
+            return TokenResult(INVALID, result.user_id)
         user.password = new_password
         db.session.add(user)
-        return True
+        return result
+
+    @staticmethod
+    def taken_fields(email=None, username=None):
+        """Return which of email and username are already registered, using a
+        single query."""
+        conditions = []
+        if email is not None:
+            email = normalize_email(email)
+            conditions.append(User.email_normalized == email)
+        if username is not None:
+            conditions.append(User.username == username)
+        if not conditions:
+            return set()
+        taken = set()
+        for row in db.session.query(User.email_normalized, User.username).filter(db.or_(*conditions)).limit(2):
+            if email is not None and row.email_normalized == email:
+                taken.add('email')
+            if username is not None and row.username == username:
+                taken.add('username')
+        return taken
 
     def __repr__(self):
         return '<User %r>' % self.username
 
 
+class Outbox(db.Model):
+    """Emails waiting for delivery by the `flask mail-worker` command."""
+    __tablename__ = 'outbox'
+    __table_args__ = (db.Index('ix_outbox_status_next_attempt_at', 'status', 'next_attempt_at'), )
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(256))
+    recipient = db.Column(db.String(64))
+    template_name = db.Column(db.String(128))
+    context = db.Column(db.Text)
+    status = db.Column(db.String(16), default='pending')
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<Outbox %r %s>' % (self.id, self.status)
+
+
+# ------------------------------------------------------------------------------
+# Identity Cache Setup:
+# ------------------------------------------------------------------------------
+# The password hash is left out: verify_password loads it on demand, so a
+# password changed in another process takes effect there at once.
+USER_SNAPSHOT_FIELDS = ('id', 'username', 'email', 'confirmed', 'role_id')
+
+
+def identity_cache(app=None):
+    """Return the application's cache of user snapshots, keyed by user id."""
+    app = app or current_app
+    cache = app.extensions.get('identity_cache')
+    if cache is None:
+        cache = app.extensions.setdefault(
+            'identity_cache', LRUCache(app.config['APP_IDENTITY_CACHE_SIZE'], app.config['APP_IDENTITY_CACHE_TTL']))
+    return cache
+
+
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def mark_user_changed(mapper, connection, user):
+    """Remember flushed user writes, so that confirm_generated_token(),
+    reset_password() and password changes invalidate the cache on commit."""
+    object_session(user).info.setdefault('changed_user_ids', set()).add(user.id)
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_changed_users(session):
+    changed = session.info.pop('changed_user_ids', ())
+    if changed:
+        cache = identity_cache(session.app)
+        for user_id in changed:
+            cache.delete(user_id)
+
+
+@db.event.listens_for(db.session, 'after_rollback')
+def forget_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
+
 # ------------------------------------------------------------------------------
 # Flask-Login User Loading Function:
 # ------------------------------------------------------------------------------
 @login_manager.user_loader
 def load_user(user_id):
     """Return user object whenever flask-login loads a user from the database
-    using user id, otherwise returns None."""
-    return User.query.get(user_id)
+    using user id, otherwise returns None. Cached snapshots are merged into the
+    session without a query, so views can still modify and commit the user."""
+    cache = identity_cache()
+    snapshot = cache.get(int(user_id))
+    if snapshot is None:
+        user = User.query.get(int(user_id))
+        if user is not None:
+            cache.set(user.id, {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS})
+        return user
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+class JobRun(db.Model):
+    """Runs of the maintenance jobs of application.scheduler."""
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_name_started_at', 'name', 'started_at'), )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64))
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    duration = db.Column(db.Float)
+    status = db.Column(db.String(16))
+    result = db.Column(db.Text)
+
+    def __repr__(self):
+        return '<JobRun %s %s>' % (self.name, self.status)
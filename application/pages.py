@@ -0,0 +1,104 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Cache of rendered pages for anonymous visitors, with ETag revalidation."""
+
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login.config import COOKIE_NAME
+
+from application.cache import LRUCache, SQLiteCache
+
+# Headers that belong to one response rather than to the page.
+UNCACHED_HEADERS = {'content-length', 'date', 'set-cookie'}
+
+# Session keys of a logged-in user (Flask-Login 0.4 and 0.5) and of pending flashes.
+PERSONAL_SESSION_KEYS = ('user_id', '_user_id', '_flashes')
+
+
+class PageCache:
+    """Caches the responses of decorated views and error handlers for
+    anonymous GET and HEAD requests whose session holds no flashed messages.
+
+    Entries are keyed by the view, its arguments and the APP_PAGE_CACHE_VARY
+    request headers, and carry a strong ETag of the body, so a matching
+    If-None-Match is answered with 304. The anonymity check reads the session
+    and remember cookie only, so a hit loads no user. APP_PAGE_CACHE_BACKEND
+    is 'memory' (per process) or 'sqlite' (shared through
+    APP_PAGE_CACHE_PATH)."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('APP_PAGE_CACHE', True)
+        app.config.setdefault('APP_PAGE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('APP_PAGE_CACHE_SIZE', 256)
+        app.config.setdefault('APP_PAGE_CACHE_TTL', 300)
+        app.config.setdefault('APP_PAGE_CACHE_VARY', ())
+        if not app.config['APP_PAGE_CACHE']:
+            return
+        if app.config['APP_PAGE_CACHE_BACKEND'] == 'sqlite':
+            backend = SQLiteCache(app.config['APP_PAGE_CACHE_PATH'], app.config['APP_PAGE_CACHE_TTL'])
+        else:
+            backend = LRUCache(app.config['APP_PAGE_CACHE_SIZE'], app.config['APP_PAGE_CACHE_TTL'])
+        app.extensions['page_cache'] = backend
+
+    @staticmethod
+    def backend(app=None):
+        """Return the application's cache backend, or None when disabled."""
+        return (app or current_app).extensions.get('page_cache')
+
+    @staticmethod
+    def is_cacheable():
+        """True for GET and HEAD requests of anonymous visitors with no
+        flashed messages waiting."""
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if any(key in session for key in PERSONAL_SESSION_KEYS):
+            return False
+        return current_app.config.get('REMEMBER_COOKIE_NAME', COOKIE_NAME) not in request.cookies
+
+    def cached(self, key=None):
+        """Decorate a view or error handler. `key` maps the decorated
+        function's arguments to the part of the cache key they contribute
+        (default: the view arguments)."""
+
+        def decorator(function):
+            name = '%s.%s' % (function.__module__, function.__name__)
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                backend = self.backend()
+                if backend is None or not self.is_cacheable():
+                    return function(*args, **kwargs)
+                cache_key = repr((name, key(*args, **kwargs) if key else sorted(kwargs.items()),
+                                  [request.headers.get(header) for header in current_app.config['APP_PAGE_CACHE_VARY']]))
+                entry = backend.get(cache_key)
+                if entry is None:
+                    response = make_response(function(*args, **kwargs))
+                    if session.modified or response.direct_passthrough or 'Set-Cookie' in response.headers:
+                        return response
+                    body = response.get_data()
+                    headers = [(header, value) for header, value in response.headers
+                               if header.lower() not in UNCACHED_HEADERS]
+                    entry = (response.status_code, headers, body, hashlib.sha256(body).hexdigest()[:32])
+                    backend.set(cache_key, entry)
+                return self._respond(entry)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _respond(entry):
+        status, headers, body, etag = entry
+        response = current_app.response_class(body, status=status, headers=headers)
+        response.set_etag(etag)
+        response.vary.add('Cookie')
+        if status == 200:
+            response.make_conditional(request)
+        return response
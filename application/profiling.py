@@ -0,0 +1,186 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Opt-in request profiling with cProfile.
+
+With APP_PROFILE, a fraction APP_PROFILE_RATE of the requests, and every
+request carrying a valid signed APP_PROFILE_HEADER (see `flask profile
+token`), is profiled. Each profile is written as a pstats file to
+APP_PROFILE_DIR/<endpoint>/, and the oldest files are removed once the
+directory grows past APP_PROFILE_MAX_BYTES. `flask profile report` merges
+the dumps into the hottest functions per endpoint.
+"""
+
+import cProfile
+import os
+import pstats
+import random
+import time
+import uuid
+from threading import Lock
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature
+
+from application.tokens import get_serializer, secret_keys
+
+PURPOSE = 'profile'
+SUFFIX = '.pstats'
+ROTATE_EVERY = 100  # Writes between scans of the directory, which also picks up other workers' dumps
+
+
+def generate_profile_token(expiration=3600):
+    """A token that has requests sent with it in APP_PROFILE_HEADER
+    profiled until it expires."""
+    return get_serializer(secret_keys()[0], PURPOSE, expiration).dumps({PURPOSE: True}).decode('utf-8')
+
+
+def verify_profile_token(token):
+    for secret_key in secret_keys():
+        try:
+            return get_serializer(secret_key, PURPOSE).loads(token) == {PURPOSE: True}
+        except BadSignature:  # Also raised for expired tokens
+            continue
+    return False
+
+
+class Profiler:
+    """Profiles the sampled requests and writes their pstats dumps. The
+    directory is scanned for rotation on the first write, then every
+    ROTATE_EVERY writes or once the size counted since passes the limit."""
+
+    def __init__(self, app=None):
+        self._sizes = {}  # Directory: [bytes as of the last scan plus this process's dumps since, writes since]
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('APP_PROFILE', False)
+        app.config.setdefault('APP_PROFILE_RATE', 0.0)
+        app.config.setdefault('APP_PROFILE_HEADER', 'X-Profile')
+        app.config.setdefault('APP_PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('APP_PROFILE_MAX_BYTES', 100 * 1024 * 1024)
+        if not app.config['APP_PROFILE']:
+            return
+        app.extensions['profiler'] = self
+        app.before_request(self._start)
+        app.after_request(self._identify)
+        app.teardown_request(self._finish)
+
+    @staticmethod
+    def sampled():
+        config = current_app.config
+        token = request.headers.get(config['APP_PROFILE_HEADER'])
+        if token:
+            return verify_profile_token(token)
+        return random.random() < config['APP_PROFILE_RATE']
+
+    def _start(self):
+        if not self.sampled():
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler is active on this thread
+            return
+        g.profile = profile
+        g.profile_name = '%d-%s%s' % (time.time() * 1000, uuid.uuid4().hex[:8], SUFFIX)
+
+    @staticmethod
+    def _identify(response):
+        if 'profile' in g:
+            response.headers['X-Profile-Id'] = g.profile_name
+        return response
+
+    def _finish(self, error=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        profile.disable()
+        self.write(profile, request.endpoint or 'none', g.pop('profile_name'))
+
+    def write(self, profile, endpoint, name):
+        config = current_app.config
+        directory = os.path.join(config['APP_PROFILE_DIR'], endpoint)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        profile.dump_stats(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            counted = self._sizes.get(config['APP_PROFILE_DIR'])
+            if counted is not None:
+                counted[0] += os.path.getsize(path)
+                counted[1] += 1
+            if counted is None or counted[0] > config['APP_PROFILE_MAX_BYTES'] or counted[1] >= ROTATE_EVERY:
+                self._sizes[config['APP_PROFILE_DIR']] = [
+                    rotate(config['APP_PROFILE_DIR'], config['APP_PROFILE_MAX_BYTES']), 0
+                ]
+        return path
+
+
+def dumps(directory):
+    """(path, size, modified) of every dump under `directory`."""
+    found = []
+    for parent, subdirectories, files in os.walk(directory):
+        for file in files:
+            if file.endswith(SUFFIX):
+                path = os.path.join(parent, file)
+                try:
+                    status = os.stat(path)
+                except FileNotFoundError:  # Rotated away by another worker
+                    continue
+                found.append((path, status.st_size, status.st_mtime))
+    return found
+
+
+def rotate(directory, max_bytes):
+    """Remove the oldest dumps until the total size is within `max_bytes`.
+    Returns the size left."""
+    found = sorted(dumps(directory), key=lambda dump: dump[2])
+    total = sum(size for path, size, modified in found)
+    for path, size, modified in found:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+# ------------------------------------------------------------------------------
+# Report:
+# ------------------------------------------------------------------------------
+def load(directory, endpoint=None):
+    """Merged pstats.Stats and the number of dumps, per endpoint."""
+    grouped = {}
+    for path, size, modified in dumps(directory):
+        name = os.path.basename(os.path.dirname(path))
+        if endpoint is None or name == endpoint:
+            grouped.setdefault(name, []).append(path)
+    merged = {}
+    for name, paths in sorted(grouped.items()):
+        stats = pstats.Stats(paths[0])
+        for path in paths[1:]:
+            stats.add(path)
+        merged[name] = (stats, len(paths))
+    return merged
+
+
+def report(directory, top=15, endpoint=None, sort='tottime'):
+    """Lines listing the `top` functions of each endpoint, by own time
+    ('tottime') or including callees ('cumtime')."""
+    column = {'tottime': 2, 'cumtime': 3}[sort]
+    lines = []
+    for name, (stats, count) in load(directory, endpoint).items():
+        per_request = stats.total_tt / count
+        lines.append('%s: %d requests, %.1f ms per request' % (name, count, per_request * 1e3))
+        lines.append('  %10s %10s %10s  %s' % ('calls', 'own ms', 'total ms', 'function'))
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][column], reverse=True)
+        for (file, line, function), (primitive, calls, own, total, callers) in rows[:top]:
+            location = '%s:%d(%s)' % (file, line, function) if line else function
+            lines.append('  %10d %10.2f %10.2f  %s' % (calls, own / count * 1e3, total / count * 1e3, location))
+        lines.append('')
+    return lines
@@ -0,0 +1,182 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Token-bucket rate limits for expensive views.
+
+A limit such as '5/minute' is a bucket holding up to 5 tokens, refilled at
+5 per minute; each request takes one, and a request finding the bucket empty
+is answered 429 with Retry-After. Buckets are kept per key (the client
+address, the account...) in this process ('memory') or in an SQLite file
+shared by the workers ('sqlite', at APP_RATE_LIMIT_PATH).
+"""
+
+import math
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock, local
+
+from flask import current_app, request, session
+from werkzeug.exceptions import TooManyRequests
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(rule):
+    """'5/minute' -> (capacity 5, refill rate in tokens per second)."""
+    count, period = rule.split('/')
+    return int(count), int(count) / PERIODS[period.strip()]
+
+
+class RateLimited(TooManyRequests):
+    def __init__(self, retry_after):
+        super().__init__('Too many attempts. Please try again in %d seconds.' % retry_after)
+        self.retry_after = retry_after
+
+
+# ------------------------------------------------------------------------------
+# Stores:
+# ------------------------------------------------------------------------------
+class MemoryBucketStore:
+    """Buckets of this process, at most `max_size`: past that the least
+    recently used one is forgotten, so keys chosen by clients cannot grow the
+    store without bound."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def consume(self, key, capacity, rate, now=None):
+        """Take a token from the bucket. Returns 0 when one was available,
+        else the seconds until there is one."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if len(self._buckets) >= self.max_size:
+                self._buckets.popitem(last=False)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore:
+    """Buckets in an SQLite file, updated in an immediate transaction so that
+    the workers sharing the file see one count."""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = local()
+        self._connection.execute('CREATE TABLE IF NOT EXISTS buckets '
+                                 '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            self._local.connection = connection
+        return connection
+
+    def consume(self, key, capacity, rate, now=None):
+        now = time.time() if now is None else now
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key, )).fetchone()
+            tokens, updated = row if row is not None else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = (1 - tokens) / rate if tokens < 1 else 0.0
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                               (key, tokens if wait else tokens - 1, now))
+            if not wait and row is None:
+                connection.execute('DELETE FROM buckets WHERE updated < ?', (now - PERIODS['day'], ))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+    def clear(self):
+        self._connection.execute('DELETE FROM buckets')
+
+
+# ------------------------------------------------------------------------------
+# Keys:
+# ------------------------------------------------------------------------------
+def remote_address():
+    """The client address; behind reverse proxies, set APP_PROXY_HOPS so that
+    it is read from X-Forwarded-For rather than being the proxy's."""
+    return request.remote_addr
+
+
+def account():
+    """The account a request is about: the email submitted with the form,
+    or else the logged-in user, read from the session."""
+    email = request.form.get('email')
+    if email:
+        from application.models import normalize_email  # The models import this package
+        return normalize_email(email)
+    user_id = session.get('_user_id') or session.get('user_id')
+    return 'user:%s' % user_id if user_id is not None else None
+
+
+class RateLimiter:
+    """Declares token-bucket limits on views with the `limit` decorator.
+    Enabled by APP_RATE_LIMIT."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('APP_RATE_LIMIT', True)
+        app.config.setdefault('APP_RATE_LIMIT_BACKEND', 'memory')
+        if not app.config['APP_RATE_LIMIT']:
+            return
+        if app.config['APP_RATE_LIMIT_BACKEND'] == 'sqlite':
+            store = SQLiteBucketStore(app.config['APP_RATE_LIMIT_PATH'])
+        else:
+            store = MemoryBucketStore(app.config.get('APP_RATE_LIMIT_SIZE', 10000))
+        app.extensions['rate_limiter'] = store
+
+    @staticmethod
+    def store(app=None):
+        """Return the application's bucket store, or None when disabled."""
+        return (app or current_app).extensions.get('rate_limiter')
+
+    def limit(self, rule, key=remote_address, methods=('POST', )):
+        """Decorate a view so that its `methods` requests take a token from
+        the bucket of `key()` (skipped when it returns None) before the view
+        runs. Stack the decorator for several limits."""
+        capacity, rate = parse_limit(rule)
+
+        def decorator(view):
+            name = '%s:%s:%s' % (view.__name__, key.__name__, rule)
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                store = self.store()
+                value = key() if store is not None and request.method in methods else None
+                if value is not None:
+                    wait = store.consume('%s:%s' % (name, value), capacity, rate)
+                    if wait:
+                        registry = current_app.extensions.get('metrics')
+                        if registry is not None:
+                            registry.inc('rate_limited_total', endpoint=request.endpoint, key=key.__name__)
+                        raise RateLimited(math.ceil(wait))
+                return view(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,46 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Read/write splitting between the primary database and read replicas."""
+
+import random
+
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends plain SELECTs to one of the APP_READ_REPLICAS binds.
+
+    Flushes, other statements and SELECT ... FOR UPDATE go to the primary. Once
+    the session has flushed, every later read of the session goes to the primary
+    as well, so a request always reads its own writes. The session lives as
+    long as the request, so the pin does too.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing:
+            self.info['pinned_to_primary'] = True
+        elif self._is_replica_read(mapper, clause):
+            state = get_state(self.app)
+            return state.db.get_engine(self.app, bind=random.choice(self.app.config['APP_READ_REPLICAS']))
+        elif clause is not None and not isinstance(clause, Select):
+            self.info['pinned_to_primary'] = True
+        return super().get_bind(mapper, clause)
+
+    def _is_replica_read(self, mapper, clause):
+        if not self.app.config.get('APP_READ_REPLICAS') or self.info.get('pinned_to_primary'):
+            return False
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            return False
+        if mapper is not None and getattr(mapper.persist_selectable, 'info', {}).get('bind_key') is not None:
+            return False
+        return True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy extension whose sessions route reads to replicas."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
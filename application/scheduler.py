@@ -0,0 +1,216 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""In-process scheduler for the database maintenance jobs.
+
+The scheduler runs in a thread started by create_app (with APP_SCHEDULER)
+or in a `flask scheduler` process. Every process that runs one competes for
+an exclusive lock on APP_SCHEDULER_LOCK; the holder is the leader of the
+host and runs the jobs, the others retry every APP_SCHEDULER_POLL seconds
+and take over if the leader exits. APP_SCHEDULER_JOBS maps job names to
+their interval in seconds, and every run is recorded in the jobs table.
+
+Under a server that forks its workers after create_app (gunicorn --preload),
+the thread does not survive the fork; run `flask scheduler` instead.
+"""
+
+import time
+from datetime import datetime, timedelta
+from threading import Event, Thread
+
+from sqlalchemy import func, or_
+
+from application import db
+from application.models import JobRun, User, identity_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: every scheduler process leads
+    fcntl = None
+
+
+# ------------------------------------------------------------------------------
+# Jobs:
+# ------------------------------------------------------------------------------
+def purge_unconfirmed(config):
+    """Delete the users left unconfirmed for APP_PURGE_UNCONFIRMED_DAYS, in
+    batches of APP_PURGE_BATCH_SIZE so the write lock is held briefly, and
+    evict them from this process's identity cache. Other processes keep
+    their snapshots until APP_IDENTITY_CACHE_TTL expires, so keep it short."""
+    cutoff = datetime.utcnow() - timedelta(days=config['APP_PURGE_UNCONFIRMED_DAYS'])
+    unconfirmed = or_(User.confirmed == False, User.confirmed.is_(None))  # noqa: E712
+    purged = 0
+    while True:
+        ids = [row.id for row in db.session.query(User.id).filter(unconfirmed, User.created_at < cutoff)
+               .order_by(User.id).limit(config['APP_PURGE_BATCH_SIZE'])]
+        if not ids:
+            return 'purged %d users' % purged
+        User.query.filter(User.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        cache = identity_cache()  # A bulk delete does not evict the snapshots
+        for user_id in ids:
+            cache.delete(user_id)
+        purged += len(ids)
+
+
+def optimize(config):
+    """Refresh the query planner statistics: a full ANALYZE the first time,
+    then PRAGMA optimize, which only analyzes the tables that need it."""
+    if not db.session.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").first():
+        db.session.execute('ANALYZE')
+        return 'analyzed'
+    db.session.execute('PRAGMA optimize')
+    return 'optimized'
+
+
+def incremental_vacuum(config):
+    """Return up to APP_VACUUM_PAGES free pages to the file system. Needs
+    auto_vacuum = INCREMENTAL, which an existing database only gets from a
+    one-time VACUUM after setting it."""
+    with db.engine.connect() as connection:
+        if connection.execute('PRAGMA auto_vacuum').scalar() != 2:
+            return 'skipped: auto_vacuum is not INCREMENTAL'
+        free = connection.execute('PRAGMA freelist_count').scalar()
+        # Each step of the pragma frees a page, and pysqlite's execute steps once; executescript runs it to the
+        # end, committing first, hence a connection of its own rather than the session's transaction.
+        connection.connection.executescript('PRAGMA incremental_vacuum(%d);' % min(free, config['APP_VACUUM_PAGES']))
+        return 'freed %d of %d pages' % (free - connection.execute('PRAGMA freelist_count').scalar(), free)
+
+
+def wal_checkpoint(config):
+    """Copy the WAL into the database and truncate it."""
+    if db.session.execute('PRAGMA journal_mode').scalar() != 'wal':
+        return 'skipped: not in WAL mode'
+    busy, frames, checkpointed = db.session.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+    return '%s: %d of %d frames' % ('busy' if busy else 'checkpointed', checkpointed, frames)
+
+
+JOBS = {
+    'purge_unconfirmed': purge_unconfirmed,
+    'optimize': optimize,
+    'incremental_vacuum': incremental_vacuum,
+    'wal_checkpoint': wal_checkpoint,
+}
+
+
+# ------------------------------------------------------------------------------
+# Scheduler:
+# ------------------------------------------------------------------------------
+class Scheduler:
+    """Runs the JOBS named in APP_SCHEDULER_JOBS at their intervals while it
+    holds the host's scheduler lock."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._next = None
+        self._lock_file = None
+        self._stop = Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['scheduler'] = self
+        if app.config['APP_SCHEDULER']:
+            self.start()
+
+    @property
+    def intervals(self):
+        return {name: seconds for name, seconds in self.app.config['APP_SCHEDULER_JOBS'].items() if seconds}
+
+    def lead(self):
+        """Take the scheduler lock unless this process holds it already.
+        Returns True while this process is the leader."""
+        if self._lock_file is not None or fcntl is None:
+            return True
+        lock_file = open(self.app.config['APP_SCHEDULER_LOCK'], 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self._next = None  # Schedule from the jobs table, as the last leader left it
+        return True
+
+    def resign(self):
+        if self._lock_file is not None:
+            self._lock_file.close()  # Releases the lock
+            self._lock_file = None
+
+    def run_job(self, name):
+        """Run a job now and record it. Returns the JobRun."""
+        with self.app.app_context():
+            started_at = datetime.utcnow()
+            start = time.perf_counter()
+            try:
+                result, status = JOBS[name](self.app.config), 'ok'
+                db.session.commit()
+            except Exception as error:  # Recorded; the next run is scheduled as usual
+                db.session.rollback()
+                self.app.logger.exception('Job %s failed', name)
+                result, status = '%s: %s' % (type(error).__name__, error), 'failed'
+            run = JobRun(name=name,
+                         started_at=started_at,
+                         duration=time.perf_counter() - start,
+                         status=status,
+                         result=result)
+            db.session.add(run)
+            db.session.commit()
+            db.session.refresh(run)
+            db.session.expunge(run)  # Readable after the app context ends
+            return run
+
+    def _schedule(self):
+        """Due times of the jobs, following their last recorded runs."""
+        with self.app.app_context():
+            last = dict(db.session.query(JobRun.name, func.max(JobRun.started_at)).group_by(JobRun.name))
+        now = datetime.utcnow()
+        return {name: (last[name] + timedelta(seconds=seconds) if name in last else now)
+                for name, seconds in self.intervals.items()}
+
+    def run_pending(self):
+        """Run the jobs that are due. Returns their JobRuns."""
+        if self._next is None:
+            self._next = self._schedule()
+        runs = []
+        for name, due in sorted(self._next.items(), key=lambda item: item[1]):
+            if due <= datetime.utcnow():
+                runs.append(self.run_job(name))
+                self._next[name] = datetime.utcnow() + timedelta(seconds=self.intervals[name])
+        return runs
+
+    def run(self):
+        """Run due jobs while leading, until stop() is called."""
+        poll = self.app.config['APP_SCHEDULER_POLL']
+        try:
+            while not self._stop.is_set():
+                wait = poll
+                try:
+                    if self.lead():
+                        self.run_pending()
+                        wait = min([poll] + [(due - datetime.utcnow()).total_seconds() for due in self._next.values()])
+                except Exception:  # Such as the database being locked; try again after the poll interval
+                    self.app.logger.exception('Scheduler iteration failed')
+                self._stop.wait(max(1.0, wait))
+        finally:
+            self.resign()
+
+    def start(self):
+        """Run the scheduler in a daemon thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = Thread(target=self.run, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def join(self):
+        """Block until the scheduler thread exits."""
+        if self._thread is not None:
+            self._thread.join()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
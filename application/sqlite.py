@@ -0,0 +1,62 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""SQLite engine tuning and statistics."""
+
+import os
+
+from sqlalchemy import event
+
+from application import db
+
+STAT_PRAGMAS = ('journal_mode', 'synchronous', 'page_size', 'page_count', 'freelist_count', 'cache_size',
+                'mmap_size', 'busy_timeout', 'auto_vacuum')
+
+
+def configure_sqlite(app):
+    """Apply SQLITE_PRAGMAS to every new connection of the app's SQLite engine.
+
+    With SQLITE_EXPLICIT_TRANSACTIONS, pysqlite's implicit transaction handling
+    is turned off and SQLAlchemy emits BEGIN itself, which makes SAVEPOINTs
+    work (the tests roll back each test this way)."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    explicit_transactions = app.config.get('SQLITE_EXPLICIT_TRANSACTIONS')
+    if not pragmas and not explicit_transactions:
+        return
+    engine = db.get_engine(app)
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        if explicit_transactions:
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in (pragmas or {}).items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+    if explicit_transactions:
+
+        @event.listens_for(engine, 'begin')
+        def begin(connection):
+            connection.execute('BEGIN')
+
+
+def database_stats():
+    """Return page, WAL and checkpoint figures of the current app's database.
+    The checkpoint is PASSIVE: it copies what it can without blocking."""
+    engine = db.engine
+    stats = {}
+    with engine.connect() as connection:
+        for name in STAT_PRAGMAS:
+            stats[name] = connection.execute('PRAGMA %s' % name).scalar()
+        stats['database_bytes'] = stats['page_size'] * stats['page_count']
+        path = engine.url.database
+        if path and path != ':memory:':
+            wal = path + '-wal'
+            stats['wal_bytes'] = os.path.getsize(wal) if os.path.exists(wal) else 0
+        if stats['journal_mode'] == 'wal':
+            busy, log_frames, checkpointed = connection.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            stats.update(checkpoint_busy=busy, wal_frames=log_frames, checkpointed_frames=checkpointed)
+    return stats
@@ -0,0 +1,62 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Signed, expiring account tokens.
+
+Each purpose ('confirm', 'reset') signs with its own salt, so a token made for
+one purpose is rejected for the other. Tokens are signed with the first key of
+APP_TOKEN_SECRET_KEYS (default: SECRET_KEY) and verified against all of them,
+which allows keys to be rotated without invalidating links already sent.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from flask import current_app
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer, BadSignature, SignatureExpired
+
+CONFIRM = 'confirm'
+RESET = 'reset'
+
+VALID = 'valid'
+EXPIRED = 'expired'
+INVALID = 'invalid'
+
+
+class TokenResult(namedtuple('TokenResult', 'status user_id')):
+    """Outcome of a token verification, truthy only when the token is valid."""
+    __slots__ = ()
+
+    def __bool__(self):
+        return self.status == VALID
+
+
+@lru_cache(maxsize=64)
+def get_serializer(secret_key, purpose, expires_in=None):
+    """Return a shared serializer for the key, purpose and expiry."""
+    return Serializer(secret_key, expires_in=expires_in, salt=purpose)
+
+
+def secret_keys():
+    return current_app.config.get('APP_TOKEN_SECRET_KEYS') or [current_app.config['SECRET_KEY']]
+
+
+def generate_token(purpose, user_id, expiration=3600):
+    serializer = get_serializer(secret_keys()[0], purpose, expiration)
+    return serializer.dumps({purpose: user_id}).decode('utf-8')
+
+
+def verify_token(purpose, token):
+    """Check signature and expiry without touching the database."""
+    for secret_key in secret_keys():
+        try:
+            data = get_serializer(secret_key, purpose).loads(token)
+        except SignatureExpired:
+            return TokenResult(EXPIRED, None)
+        except BadSignature:
+            continue
+        user_id = data.get(purpose) if isinstance(data, dict) else None
+        if not isinstance(user_id, int):
+            break
+        return TokenResult(VALID, user_id)
+    return TokenResult(INVALID, None)
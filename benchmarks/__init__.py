@@ -0,0 +1,4 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Micro-benchmarks of the hot paths, run with `flask bench`."""
@@ -0,0 +1,97 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Password hashing, token and user loading benchmarks."""
+
+from application import db
+from application.models import User, load_user, identity_cache
+from application.tokens import RESET, verify_token
+from benchmarks.runner import benchmark
+
+
+def create_user():
+    user = User.query.filter_by(username='bench').first()
+    if user is None:
+        user = User(email='bench@example.com', username='bench', password='secret', confirmed=True)
+        db.session.add(user)
+        db.session.commit()
+    return user
+
+
+@benchmark('password.set')
+def password_set(app):
+    user = User()
+
+    def run():
+        user.password = 'secret'
+
+    return run
+
+
+@benchmark('password.verify')
+def password_verify(app):
+    user = User(password='secret')
+    return lambda: user.verify_password('secret')
+
+
+@benchmark('token.confirm.roundtrip')
+def confirmation_token(app):
+    user = create_user()
+
+    def run():
+        user.confirm_generated_token(user.generate_confirmation_token())
+        db.session.rollback()
+
+    return run
+
+
+@benchmark('token.reset.generate')
+def reset_token_generate(app):
+    user = create_user()
+    return user.generate_reset_token
+
+
+@benchmark('token.reset.verify')
+def reset_token_verify(app):
+    token = create_user().generate_reset_token()
+    return lambda: verify_token(RESET, token)
+
+
+@benchmark('token.reset.reject')
+def reset_token_reject(app):
+    token = create_user().generate_reset_token() + 'x'
+    return lambda: verify_token(RESET, token)
+
+
+@benchmark('token.reset.apply')
+def reset_password(app):
+    token = create_user().generate_reset_token()
+
+    def run():
+        User.reset_password(token, 'secret')
+        db.session.rollback()  # Keep the token valid for the next call
+
+    return run
+
+
+@benchmark('load_user.uncached')
+def load_user_uncached(app):
+    user_id = str(create_user().id)
+
+    def run():
+        identity_cache().clear()
+        load_user(user_id)
+        db.session.remove()
+
+    return run
+
+
+@benchmark('load_user.cached')
+def load_user_cached(app):
+    user_id = str(create_user().id)
+
+    def run():
+        load_user(user_id)
+        db.session.remove()
+
+    return run
@@ -0,0 +1,42 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Template rendering benchmarks."""
+
+from flask import render_template
+
+from application.auth.forms import LoginForm
+from application.models import User
+from benchmarks.runner import benchmark
+
+
+@benchmark('render.index')
+def render_index(app):
+    return lambda: render_template('index.html')
+
+
+@benchmark('render.auth.login')
+def render_login(app):
+    return lambda: render_template('auth/login.html', form=LoginForm())
+
+
+@benchmark('render.email.confirm')
+def render_confirm_email(app):
+    user = User(username='bench')
+
+    def run():
+        render_template('auth/email/confirm.txt', user=user, token='token')
+        render_template('auth/email/confirm.html', user=user, token='token')
+
+    return run
+
+
+@benchmark('render.email.reset')
+def render_reset_email(app):
+    user = User(username='bench')
+
+    def run():
+        render_template('auth/email/reset.txt', user=user, token='token')
+        render_template('auth/email/reset.html', user=user, token='token')
+
+    return run
@@ -0,0 +1,274 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""End-to-end load generator for the authentication flows, run with
+`flask loadtest`."""
+
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, build_opener
+
+from application import create_app, db
+from application.models import User, normalize_email
+from application.sqlite import configure_sqlite
+from application.tokens import CONFIRM, generate_token
+from config import ProductionConfig
+
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]*)"')
+PASSWORD = 'load-test-password'
+DEFAULT_MIX = 'index=40,login=25,register=10,confirm=10,reset=15'
+
+
+# ------------------------------------------------------------------------------
+# Target Setup:
+# ------------------------------------------------------------------------------
+def create_target_app(config_name='testing', database=None):
+    """Create an app for in-process runs, on a file database so that client
+    threads get their own connections, with outgoing mail suppressed."""
+    app = create_app(config_name)
+    if database is None:
+        database = os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'loadtest.sqlite')
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + database,
+                      SQLALCHEMY_ENGINE_OPTIONS=ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS,
+                      SQLITE_PRAGMAS=ProductionConfig.SQLITE_PRAGMAS,
+                      SQLITE_EXPLICIT_TRANSACTIONS=False,
+                      MAIL_SUPPRESS_SEND=True)
+    configure_sqlite(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed_users(app, count, batch_size=1000, echo=print):
+    """Insert `count` users with executemany batches. Half of them are left
+    unconfirmed for the confirm flow. Returns (id, email, confirmed) rows."""
+    tag = uuid.uuid4().hex[:6]
+    with app.app_context():
+        password_hash = User(password=PASSWORD).password_hash
+        table = User.__table__
+        start = time.perf_counter()
+        for first in range(0, count, batch_size):
+            rows = []
+            for number in range(first, min(first + batch_size, count)):
+                email = 'load-%s-%d@example.com' % (tag, number)
+                rows.append(
+                    dict(email=email,
+                         email_normalized=normalize_email(email),
+                         username='load_%s_%d' % (tag, number),
+                         password_hash=password_hash,
+                         confirmed=number % 2 == 0))
+            db.session.execute(table.insert(), rows)
+            db.session.commit()
+        echo('Seeded %d users in %.2fs.' % (count, time.perf_counter() - start))
+        users = db.session.query(User.id, User.email, User.confirmed) \
+            .filter(User.username.like('load\\_%s\\_%%' % tag, escape='\\')).all()
+        tokens = {user.id: generate_token(CONFIRM, user.id) for user in users}
+        db.session.remove()
+    return [(user.id, user.email, user.confirmed, tokens[user.id]) for user in users]
+
+
+# ------------------------------------------------------------------------------
+# Clients:
+# ------------------------------------------------------------------------------
+class InProcessClient:
+    """Drives the WSGI app directly through a Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data(as_text=True)
+
+    def post(self, path, data):
+        response = self.client.post(path, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPClient:
+    """Drives a running server over HTTP, keeping cookies, without following
+    redirects."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect())
+
+    def _open(self, path, data=None):
+        try:
+            with self.opener.open(urljoin(self.base_url, path), data, timeout=30) as response:
+                return response.status, response.read().decode('utf-8', 'replace')
+        except HTTPError as error:
+            return error.code, error.read().decode('utf-8', 'replace')
+
+    def get(self, path):
+        return self._open(path)
+
+    def post(self, path, data):
+        return self._open(path, urlencode(data).encode('ascii'))
+
+
+# ------------------------------------------------------------------------------
+# Scenarios:
+# ------------------------------------------------------------------------------
+class VirtualUser:
+    """One simulated visitor. Every request is recorded under its endpoint."""
+
+    def __init__(self, client, users, recorder, rng):
+        self.client = client
+        self.users = users
+        self.recorder = recorder
+        self.rng = rng
+
+    def request(self, endpoint, method, path, data=None, expect=(200, 302)):
+        start = time.perf_counter()
+        try:
+            if method == 'GET':
+                status, body = self.client.get(path)
+            else:
+                status, body = self.client.post(path, data)
+        except Exception:  # Connection errors count as failures, not crashes
+            status, body = 0, ''
+        self.recorder.record('%s %s' % (method, endpoint), time.perf_counter() - start, status in expect)
+        return status, body
+
+    def form(self, endpoint, path, data):
+        status, body = self.request(endpoint, 'GET', path)
+        match = CSRF_PATTERN.search(body)
+        if match:
+            data = dict(data, csrf_token=match.group(1))
+        return self.request(endpoint, 'POST', path, data, expect=(302, ))
+
+    def login(self, email):
+        return self.form('auth.login', '/auth/login', {'email': email, 'password': PASSWORD})
+
+    def logout(self):
+        self.request('auth.logout', 'GET', '/auth/logout', expect=(302, ))
+
+    def index(self):
+        self.request('main.index', 'GET', '/')
+
+    def login_flow(self):
+        user_id, email, confirmed, token = self.rng.choice(self.users)
+        self.login(email)
+        self.logout()
+
+    def register(self):
+        name = 'reg_%s' % uuid.uuid4().hex[:12]
+        self.form('auth.register', '/auth/register', {
+            'email': name + '@example.com',
+            'username': name,
+            'password': PASSWORD,
+            'password_confirm': PASSWORD
+        })
+
+    def confirm(self):
+        user_id, email, confirmed, token = self.rng.choice(self.users)
+        self.login(email)
+        self.request('auth.confirm', 'GET', '/auth/confirm/' + token, expect=(302, ))
+        self.logout()
+
+    def reset(self):
+        user_id, email, confirmed, token = self.rng.choice(self.users)
+        self.form('auth.password_reset_request', '/auth/reset', {'email': email})
+
+
+SCENARIOS = {
+    'index': VirtualUser.index,
+    'login': VirtualUser.login_flow,
+    'register': VirtualUser.register,
+    'confirm': VirtualUser.confirm,
+    'reset': VirtualUser.reset,
+}
+
+
+def parse_mix(text):
+    """Parse 'index=40,login=25' into scenario weights."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError('Unknown scenario %r, expected one of %s' % (name, ', '.join(SCENARIOS)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# ------------------------------------------------------------------------------
+# Recording and Reporting:
+# ------------------------------------------------------------------------------
+class Recorder:
+    """Latencies and failures per endpoint, shared by the client threads."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(recorder, elapsed):
+    """Return the report lines: throughput, per-endpoint latency percentiles and
+    error rates."""
+    total = sum(len(values) for values in recorder.latencies.values())
+    errors = sum(recorder.errors.values())
+    lines = [
+        '%d requests in %.1fs: %.1f req/s, %.2f%% errors' %
+        (total, elapsed, total / elapsed if elapsed else 0, 100.0 * errors / total if total else 0), '',
+        '%-36s %7s %8s %8s %8s %8s %8s' % ('endpoint', 'count', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms')
+    ]
+    for endpoint in sorted(recorder.latencies):
+        ordered = sorted(recorder.latencies[endpoint])
+        lines.append('%-36s %7d %7.1f%% %8.1f %8.1f %8.1f %8.1f' %
+                     (endpoint, len(ordered), 100.0 * recorder.errors[endpoint] / len(ordered),
+                      percentile(ordered, 0.5) * 1e3, percentile(ordered, 0.9) * 1e3,
+                      percentile(ordered, 0.99) * 1e3, ordered[-1] * 1e3))
+    return lines
+
+
+def run(client_factory, users, clients=8, duration=30.0, iterations=None, mix=DEFAULT_MIX, seed=0):
+    """Run `clients` virtual users concurrently, each replaying scenarios
+    drawn from `mix` until `duration` seconds pass or it has run
+    `iterations` scenarios. Returns (recorder, elapsed seconds)."""
+    weights = parse_mix(mix) if isinstance(mix, str) else mix
+    names, values = list(weights), list(weights.values())
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    def work(number):
+        rng = random.Random(seed + number)
+        visitor = VirtualUser(client_factory(), users, recorder, rng)
+        done = 0
+        while time.perf_counter() < deadline and (iterations is None or done < iterations):
+            SCENARIOS[rng.choices(names, values)[0]](visitor)
+            done += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(number, ), daemon=True) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start
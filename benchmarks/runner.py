@@ -0,0 +1,113 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Benchmark registry, timing, statistics and baseline comparison."""
+
+import importlib
+import json
+import platform
+import statistics
+import time
+from collections import OrderedDict
+
+MODULES = ('benchmarks.bench_models', 'benchmarks.bench_templates')
+
+registry = OrderedDict()
+
+
+def benchmark(name):
+    """Register a benchmark. The decorated function receives the benchmark
+    app, inside an app and request context, and returns the zero-argument
+    callable to time."""
+
+    def decorator(function):
+        registry[name] = function
+        return function
+
+    return decorator
+
+
+def load():
+    for module in MODULES:
+        importlib.import_module(module)
+    return registry
+
+
+def measure(function, min_time=0.2, samples=15):
+    """Time `function`. Calls are batched so each sample lasts about
+    min_time / samples, which keeps timer resolution out of the figures.
+    Returns per-call timings in seconds."""
+    function()  # Warm up caches and lazy imports
+    target = min_time / samples
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target or loops >= 1 << 20:
+            break
+        loops *= 2
+    timings = [elapsed / loops]
+    for _ in range(samples - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        timings.append((time.perf_counter() - start) / loops)
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return OrderedDict(median=median,
+                       p95=p95,
+                       stdev=statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+                       ops_per_second=1 / median if median else float('inf'),
+                       samples=len(ordered))
+
+
+def run(app, pattern=None, min_time=0.2, samples=15, echo=print):
+    """Run the registered benchmarks whose name contains `pattern`."""
+    results = OrderedDict()
+    for name, setup in load().items():
+        if pattern and pattern not in name:
+            continue
+        with app.app_context(), app.test_request_context():
+            function = setup(app)
+            results[name] = summarize(measure(function, min_time, samples))
+        echo(format_result(name, results[name]))
+    return results
+
+
+def format_result(name, result):
+    return '%-32s median %10.1f us   p95 %10.1f us   %12.1f ops/s' % (
+        name, result['median'] * 1e6, result['p95'] * 1e6, result['ops_per_second'])
+
+
+def save(results, path):
+    document = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results
+    }
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=2)
+
+
+def compare(results, baseline_path, threshold=0.1):
+    """Return (name, baseline median, median, change) for every benchmark
+    whose median grew by more than `threshold` over the stored baseline."""
+    with open(baseline_path) as file:
+        baseline = json.load(file)['results']
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median'], result['median']
+        change = after / before - 1
+        if change > threshold:
+            regressions.append((name, before, after, change))
+    return regressions
@@ -0,0 +1,96 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Start-up profile of a worker, run with `flask startup-profile`.
+
+A fresh interpreter imports the application with `-X importtime` and calls
+create_app, as a server worker does, then uses each lazily initialized
+extension once. The import log is split at that point, so modules loaded on
+first use are reported apart from the start-up ones.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+FIRST_USE = '-- first use'
+SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from application import create_app, lazy
+import application
+imported = time.perf_counter()
+app = create_app(%(config)r)
+created = time.perf_counter()
+sys.stderr.write(%(marker)r + '\\n')
+sys.stderr.flush()
+deferred = {}
+for name in ('mail', 'moment'):
+    extension = getattr(application, name)
+    if isinstance(extension, lazy.LazyExtension) and not extension.loaded:
+        before = time.perf_counter()
+        extension.get(app)
+        deferred[name] = time.perf_counter() - before
+print(json.dumps({'import': imported - started, 'create_app': created - imported, 'deferred': deferred}))
+'''
+
+
+def parse_importtime(lines):
+    """(module, self seconds, cumulative seconds) for each line of an
+    -X importtime log."""
+    modules = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|', 2)
+        modules.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+    return modules
+
+
+def by_package(modules):
+    """Self time summed per top-level package, slowest first."""
+    totals = defaultdict(float)
+    for name, own, cumulative in modules:
+        totals[name.split('.')[0]] += own
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def profile(config_name='production', cwd=None):
+    """Start the application in a fresh interpreter. Returns the timings,
+    the modules imported at start-up and those imported on first use."""
+    cwd = cwd or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                              SCRIPT % {'config': config_name, 'marker': FIRST_USE}],
+                             cwd=cwd,
+                             env=dict(os.environ, APP_SCHEDULER='0'),  # No maintenance jobs in the profiled process
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             universal_newlines=True,
+                             check=True)
+    log = process.stderr.splitlines()
+    split = log.index(FIRST_USE) if FIRST_USE in log else len(log)
+    timings = json.loads(process.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(log[:split]), parse_importtime(log[split:])
+
+
+def report(timings, startup, first_use, top=15):
+    lines = ['Import application: %7.1f ms' % (timings['import'] * 1e3),
+             'create_app:         %7.1f ms' % (timings['create_app'] * 1e3),
+             '',
+             'Slowest packages at start-up (self time):']
+    for package, seconds in by_package(startup)[:top]:
+        lines.append('  %-32s %7.1f ms' % (package, seconds * 1e3))
+    lines += ['', 'Slowest modules at start-up (cumulative):']
+    for name, own, cumulative in sorted(startup, key=lambda module: module[2], reverse=True)[:top]:
+        lines.append('  %-32s %7.1f ms' % (name, cumulative * 1e3))
+    lines += ['', 'Deferred extensions (cost on first use):']
+    if not timings['deferred']:
+        lines.append('  none; APP_LAZY_EXTENSIONS is off')
+    for name, seconds in sorted(timings['deferred'].items()):
+        lines.append('  %-32s %7.1f ms' % (name, seconds * 1e3))
+    if first_use:
+        lines.append('  %d modules imported on first use, %.1f ms' % (len(first_use), sum(
+            own for name, own, cumulative in first_use) * 1e3))
+    return lines
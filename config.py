@@ -5,11 +5,14 @@
 
 import os
 
+from sqlalchemy.pool import QueuePool
+
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
+    APP_TOKEN_SECRET_KEYS = [key for key in os.getenv('APP_TOKEN_SECRET_KEYS', '').split(',') if key]
     WTF_CSRF_SECRET_KEY = os.getenv('WTF_CSRF_SECRET_KEY')
     WTF_CSRF_TIME_LIMIT = 3600
     WTF_CSRF_ENABLED = True
@@ -19,12 +22,71 @@ class Config:
     MAIL_SUPPRESS_SEND = False
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAIL_WORKERS = 2
+    MAIL_QUEUE_SIZE = 100
+    MAIL_QUEUE_TIMEOUT = 5
+    MAIL_IDLE_TIMEOUT = 30
+    APP_MAIL_OUTBOX = True
+    APP_MAIL_OUTBOX_MAX_ATTEMPTS = 5
+    APP_MAIL_OUTBOX_BACKOFF = 30
+    APP_MAIL_OUTBOX_LEASE = 300
     APP_MAIL_SENDER = ('Admin', os.getenv('MAIL_DEFAULT_SENDER'))
     APP_MAIL_SUBJECT_PREFIX = 'Flask: '
+    APP_BASE_URL = os.getenv('APP_BASE_URL', 'http://localhost:5000/')  # For links in emails sent outside requests
     APP_ADMIN = os.getenv('APP_ADMIN')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_BINDS = {}
+    APP_READ_REPLICAS = []  # Keys of SQLALCHEMY_BINDS that replicate the primary
     REMEMBER_COOKIE_DURATION = 31536000
     SESSION_PROTECTION = 'strong'
+    APP_IDENTITY_CACHE_SIZE = 1024
+    APP_IDENTITY_CACHE_TTL = 60  # Seconds; other workers may serve a purged user's snapshot this long
+    APP_PASSWORD_HASH_METHOD = 'pbkdf2:sha256:150000'
+    APP_PASSWORD_SALT_LENGTH = 8
+    APP_PASSWORD_HASH_WORKERS = None  # One process per core
+    APP_METRICS_ENABLED = True
+    APP_AVAILABILITY_CAPACITY = 100000
+    APP_AVAILABILITY_ERROR_RATE = 0.01
+    APP_AVAILABILITY_REFRESH = 300
+    APP_AVAILABILITY_WARM = False  # Build the availability filters in a thread started by create_app
+    APP_PAGE_CACHE = True
+    APP_PAGE_CACHE_BACKEND = 'memory'  # Or 'sqlite', shared by the workers through APP_PAGE_CACHE_PATH
+    APP_PAGE_CACHE_PATH = os.path.join(basedir, 'page-cache.sqlite')
+    APP_PAGE_CACHE_SIZE = 256
+    APP_PAGE_CACHE_TTL = 300
+    APP_PAGE_CACHE_VARY = ()  # Request headers that select a different rendering
+    APP_TEMPLATE_CACHE_DIR = os.getenv('APP_TEMPLATE_CACHE_DIR')  # Jinja bytecode cache, shared by the workers
+    APP_TEMPLATE_WARMUP = False  # Compile every template in create_app
+    APP_ASSETS_ENABLED = True  # Serve the output of `flask assets build` when present
+    APP_COMPRESSION = True
+    APP_PROFILE = False  # Profile sampled requests and those with a signed APP_PROFILE_HEADER
+    APP_PROFILE_RATE = 0.0  # Fraction of the requests profiled
+    APP_PROFILE_HEADER = 'X-Profile'
+    APP_PROFILE_DIR = os.path.join(basedir, 'profiles')
+    APP_PROFILE_MAX_BYTES = 100 * 1024 * 1024  # The oldest dumps are removed past this
+    APP_RATE_LIMIT = True
+    APP_RATE_LIMIT_BACKEND = 'memory'  # Or 'sqlite', shared by the workers through APP_RATE_LIMIT_PATH
+    APP_RATE_LIMIT_PATH = os.path.join(basedir, 'rate-limits.sqlite')
+    APP_RATE_LIMIT_SIZE = 10000  # Buckets kept by the 'memory' backend; the least recently used go first
+    APP_PROXY_HOPS = int(os.getenv('APP_PROXY_HOPS', '0'))  # Trusted reverse proxies setting X-Forwarded-For
+    APP_SCHEDULER = False  # Run the maintenance jobs in a thread of each process; one leads per host
+    APP_SCHEDULER_LOCK = os.path.join(basedir, 'scheduler.lock')
+    APP_SCHEDULER_POLL = 60  # Seconds between attempts to become the leader
+    APP_SCHEDULER_JOBS = {  # Seconds between runs; 0 disables a job
+        'purge_unconfirmed': 3600,
+        'optimize': 86400,
+        'incremental_vacuum': 86400,
+        'wal_checkpoint': 600
+    }
+    APP_PURGE_UNCONFIRMED_DAYS = 30
+    APP_PURGE_BATCH_SIZE = 100
+    APP_VACUUM_PAGES = 1000
+    APP_LAZY_EXTENSIONS = True  # Import and initialize Flask-Mail and Flask-Moment on first use
+    APP_COMPRESSION_MIN_SIZE = 500  # Bytes; smaller bodies gain less than the framing costs
+    APP_COMPRESSION_LEVEL = 6
+    APP_COMPRESSION_PRIVATE = False  # Compress Cache-Control: private pages, such as forms, despite BREACH
+    APP_COMPRESSION_MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                                 'application/json', 'image/svg+xml')
 
     @staticmethod
     def init_app(app):
@@ -34,16 +96,47 @@ class Config:
 class DevelopmentConfig(Config):
     DEBUG = True
     MAIL_DEBUG = True
+    APP_ASSETS_ENABLED = False  # Edited static files show up without a rebuild
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'data-dev.sqlite')
 
 
 class TestingConfig(Config):
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite://'  # In-memory database
+    SECRET_KEY = os.getenv('SECRET_KEY', 'testing-secret-key')
+    WTF_CSRF_SECRET_KEY = os.getenv('WTF_CSRF_SECRET_KEY', 'testing-csrf-secret-key')
+    APP_PASSWORD_HASH_WORKERS = 0  # Hash on the calling thread
+    SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite://')  # In-memory database by default
+    SQLITE_EXPLICIT_TRANSACTIONS = True
+    APP_RATE_LIMIT = False
 
 
 class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'data.sqlite')
+    APP_TEMPLATE_CACHE_DIR = os.getenv('APP_TEMPLATE_CACHE_DIR', os.path.join(basedir, 'template-cache'))
+    APP_TEMPLATE_WARMUP = True
+    APP_AVAILABILITY_WARM = True
+    APP_SCHEDULER = os.getenv('APP_SCHEDULER', '1') == '1'
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': QueuePool,
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+        'connect_args': {
+            'timeout': 30,
+            'check_same_thread': False
+        }
+    }
+    SQLITE_PRAGMAS = {
+        'auto_vacuum': 'INCREMENTAL',  # Takes effect on new databases only; must come before journal_mode
+        'journal_mode': 'WAL',  # Readers no longer block the writer
+        'synchronous': 'NORMAL',  # Durable enough with WAL, far fewer fsyncs
+        'mmap_size': 268435456,  # 256 MiB
+        'cache_size': -65536,  # 64 MiB
+        'busy_timeout': 30000,  # Wait 30s for locks instead of failing
+        'temp_store': 'MEMORY'
+    }
 
 
 config = {
@@ -0,0 +1,53 @@
+"""normalized_email
+
+Revision ID: 02c133e1dda5
+Revises: eddfce9ccbb4
+Create Date: 2026-10-17 10:02:17.530114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '02c133e1dda5'
+down_revision = 'eddfce9ccbb4'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+users = sa.table('users', sa.column('id', sa.Integer), sa.column('email', sa.String),
+                 sa.column('email_normalized', sa.String))
+
+
+def upgrade():
+    op.add_column('users', sa.Column('email_normalized', sa.String(length=64), nullable=True))
+
+    # Backfill in id order, one batch per round trip, so large tables never
+    # hold every row in memory.
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select([users.c.id, users.c.email]).where(users.c.id > last_id).order_by(users.c.id).limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(
+            users.update().where(users.c.id == sa.bindparam('user_id')).values(email_normalized=sa.bindparam('value')),
+            [{'user_id': row.id, 'value': row.email.strip().lower() if row.email else row.email} for row in rows])
+        last_id = rows[-1].id
+
+    duplicates = connection.execute(
+        sa.select([users.c.email_normalized]).where(users.c.email_normalized.isnot(None))
+        .group_by(users.c.email_normalized).having(sa.func.count() > 1)).fetchall()
+    if duplicates:
+        raise RuntimeError('Emails differing only in case must be merged first: %s' %
+                           ', '.join(row[0] for row in duplicates))
+    op.create_index(op.f('ix_users_email_normalized'), 'users', ['email_normalized'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_users_email_normalized'), table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('email_normalized')
@@ -0,0 +1,42 @@
+"""maintenance_jobs
+
+Revision ID: 7b3e9f41c2a8
+Revises: 02c133e1dda5
+Create Date: 2026-10-17 14:21:08.402317
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7b3e9f41c2a8'
+down_revision = '02c133e1dda5'
+branch_labels = None
+depends_on = None
+
+users = sa.table('users', sa.column('created_at', sa.DateTime))
+
+
+def upgrade():
+    op.add_column('users', sa.Column('created_at', sa.DateTime(), nullable=True))
+    # Existing accounts count their age from the upgrade, so none is purged
+    # before it has had the full APP_PURGE_UNCONFIRMED_DAYS to confirm.
+    op.execute(users.update().where(users.c.created_at.is_(None)).values(created_at=datetime.utcnow()))
+    op.create_index(op.f('ix_users_created_at'), 'users', ['created_at'], unique=False)
+    op.create_table('jobs', sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('name', sa.String(length=64), nullable=True),
+                    sa.Column('started_at', sa.DateTime(), nullable=True),
+                    sa.Column('duration', sa.Float(), nullable=True),
+                    sa.Column('status', sa.String(length=16), nullable=True),
+                    sa.Column('result', sa.Text(), nullable=True), sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_jobs_name_started_at', 'jobs', ['name', 'started_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_jobs_name_started_at', table_name='jobs')
+    op.drop_table('jobs')
+    op.drop_index(op.f('ix_users_created_at'), table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('created_at')
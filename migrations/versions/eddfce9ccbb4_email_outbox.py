@@ -0,0 +1,37 @@
+"""email_outbox
+
+Revision ID: eddfce9ccbb4
+Revises: 5617891ffeba
+Create Date: 2026-10-17 09:12:41.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'eddfce9ccbb4'
+down_revision = '5617891ffeba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox', sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('subject', sa.String(length=256), nullable=True),
+                    sa.Column('recipient', sa.String(length=64), nullable=True),
+                    sa.Column('template_name', sa.String(length=128), nullable=True),
+                    sa.Column('context', sa.Text(), nullable=True),
+                    sa.Column('status', sa.String(length=16), nullable=True),
+                    sa.Column('attempts', sa.Integer(), nullable=True),
+                    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+                    sa.Column('claim_token', sa.String(length=32), nullable=True),
+                    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+                    sa.Column('sent_at', sa.DateTime(), nullable=True),
+                    sa.Column('last_error', sa.Text(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=True), sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_outbox_status_next_attempt_at', 'outbox', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_outbox_status_next_attempt_at', table_name='outbox')
+    op.drop_table('outbox')
@@ -0,0 +1,78 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Test database setup: a schema template copied with the SQLite backup API,
+and a test case that rolls back everything a test writes."""
+
+import sqlite3
+import unittest
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from application import create_app, db
+from application import models  # noqa: F401 (registers the tables on db.metadata)
+
+_template = None
+
+
+def schema_template():
+    """Return an in-memory SQLite connection holding the schema, built once
+    per process."""
+    global _template
+    if _template is None:
+        connection = sqlite3.connect(':memory:', check_same_thread=False)
+        engine = create_engine('sqlite://', creator=lambda: connection, poolclass=StaticPool)
+        db.metadata.create_all(engine)
+        _template = connection
+    return _template
+
+
+def copy_database(source, path):
+    """Copy the `source` connection into the SQLite file at `path`."""
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def restart_savepoint(session, transaction):
+    """Keep a test session inside a SAVEPOINT, so that its commits and
+    rollbacks never end the transaction the test case rolls back."""
+    if session.info.get('test_savepoint') and transaction.nested and not transaction._parent.nested:
+        session.expire_all()
+        session.begin_nested()
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Runs each test on one connection inside a transaction that is rolled
+    back on tear down. An in-memory database is filled from the schema
+    template; a file database (TEST_DATABASE_URL, as `flask test --parallel`
+    sets up) already holds the schema."""
+
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        if db.engine.url.database in (None, '', ':memory:'):
+            raw_connection = db.engine.raw_connection()
+            schema_template().backup(raw_connection.connection)
+            raw_connection.close()
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        self.create_session = db.session.registry.createfunc
+        db.session.registry.createfunc = self._create_session
+
+    def _create_session(self):
+        session = self.create_session(bind=self.connection, binds={}, info={'test_savepoint': True})
+        session.begin_nested()
+        return session
+
+    def tearDown(self):
+        db.session.remove()
+        db.session.registry.createfunc = self.create_session
+        self.transaction.rollback()
+        self.connection.close()
+        self.app_context.pop()
@@ -0,0 +1,65 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Runs test modules across worker processes, each on its own copy of the
+schema template database. Used by `flask test --parallel N`."""
+
+import fnmatch
+import io
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import TestingConfig
+from tests.database import copy_database, schema_template
+
+
+def discover_modules(start='tests', pattern='test*.py'):
+    """Return the dotted names of the test modules under `start`."""
+    package = start.replace(os.sep, '.')
+    return sorted('%s.%s' % (package, name[:-3]) for name in os.listdir(start) if fnmatch.fnmatch(name, pattern))
+
+
+def _start_worker(directory, template):
+    path = os.path.join(directory, 'worker-%d.sqlite' % os.getpid())
+    source = sqlite3.connect(template)
+    try:
+        copy_database(source, path)
+    finally:
+        source.close()
+    TestingConfig.SQLALCHEMY_DATABASE_URI = os.environ['TEST_DATABASE_URL'] = 'sqlite:///' + path
+
+
+def _run_module(name, verbosity):
+    stream = io.StringIO()
+    tests = unittest.TestLoader().loadTestsFromName(name)
+    result = unittest.TextTestRunner(stream=stream, verbosity=verbosity).run(tests)
+    return name, stream.getvalue(), result.testsRun, len(result.failures), len(result.errors)
+
+
+def run(names, workers, verbosity=2, echo=print):
+    """Run the test modules `names` on `workers` processes and echo each
+    module's report as it finishes. Returns True when every test passed."""
+    start = time.perf_counter()
+    total = failures = errors = 0
+    with tempfile.TemporaryDirectory(prefix='tests-') as directory:
+        template = os.path.join(directory, 'template.sqlite')
+        copy_database(schema_template(), template)
+        # Spawned rather than forked: tests start process pools of their own
+        with ProcessPoolExecutor(workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_start_worker,
+                                 initargs=(directory, template)) as executor:
+            futures = [executor.submit(_run_module, name, verbosity) for name in names]
+            for future in as_completed(futures):
+                name, output, count, failed, errored = future.result()
+                total, failures, errors = total + count, failures + failed, errors + errored
+                echo('%s\n%s' % (name, output.rstrip()))
+    echo('Ran %d tests from %d modules on %d workers in %.3fs: %s' %
+         (total, len(names), workers, time.perf_counter() - start,
+          'OK' if not failures and not errors else 'FAILED (failures=%d, errors=%d)' % (failures, errors)))
+    return not failures and not errors
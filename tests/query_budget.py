@@ -0,0 +1,75 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+"""Query budget assertions for tests."""
+
+import functools
+from collections import defaultdict
+
+from sqlalchemy import event
+
+from application import db
+from application.metrics import TRANSACTION_CONTROL
+
+
+class QueryBudget:
+    """Count the SQL statements executed on the db engine and fail when more
+    than `budget` run, or when the same statement runs more than
+    `repeat_limit` times with different parameters (the N+1 pattern).
+
+    Use as a context manager inside an app context::
+
+        with QueryBudget(2):
+            self.client.post('/auth/login', data=...)
+
+    or as a decorator on a test method.
+    """
+
+    def __init__(self, budget, repeat_limit=1, engine=None):
+        self.budget = budget
+        self.repeat_limit = repeat_limit
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(TRANSACTION_CONTROL):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        self.engine = self.engine or db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+        if exc_type is None:
+            self.check()
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with QueryBudget(self.budget, self.repeat_limit, self.engine):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self):
+        """Statements executed with more than repeat_limit parameter sets."""
+        parameter_sets = defaultdict(set)
+        for statement, parameters in self.statements:
+            parameter_sets[statement].add(repr(parameters))
+        return {statement: len(sets) for statement, sets in parameter_sets.items() if len(sets) > self.repeat_limit}
+
+    def check(self):
+        listing = '\n'.join('  %s %r' % (statement, parameters) for statement, parameters in self.statements)
+        if self.count > self.budget:
+            raise AssertionError('%d queries executed, budget is %d:\n%s' % (self.count, self.budget, listing))
+        repeated = self.repeated()
+        if repeated:
+            details = '\n'.join('  %dx %s' % (times, statement) for statement, times in repeated.items())
+            raise AssertionError('Statements repeated with different parameters:\n%s' % details)
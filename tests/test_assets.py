@@ -0,0 +1,89 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import brotli
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from flask import url_for
+from application import create_app
+from application.assets import IMMUTABLE, MOMENT, build, configure_assets
+
+
+class AssetPipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.directory.name, 'static')
+        self.app = create_app('testing')
+        shutil.copytree(self.app.static_folder, self.static)
+        moment = os.path.join(self.directory.name, 'moment.js')
+        with open(moment, 'w') as file:
+            file.write('var moment = function () {};\n' * 20)
+        self.manifest = build(self.static, moment, echo=lambda line: None)
+        self.app.static_folder = self.static
+        configure_assets(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_build_fingerprints_and_compresses(self):
+        self.assertRegex(self.manifest['favicon.ico'], r'^dist/favicon\.[0-9a-f]{12}\.ico$')
+        self.assertIn(MOMENT, self.manifest)
+        script = os.path.join(self.static, self.manifest['vendor/jquery/jquery.min.js'])
+        with open(script, 'rb') as file, gzip.open(script + '.gz') as compressed:
+            self.assertEqual(file.read(), compressed.read())
+        with open(os.path.join(self.static, self.manifest['vendor/bootstrap/css/bootstrap.min.css'])) as file:
+            stylesheet = file.read()
+        font = os.path.basename(self.manifest['vendor/bootstrap/fonts/glyphicons-halflings-regular.woff2'])
+        self.assertIn('url(../fonts/%s)' % font, stylesheet)
+
+    def test_url_for_static_is_fingerprinted(self):
+        with self.app.test_request_context():
+            self.assertEqual(url_for('static', filename='favicon.ico'), '/static/' + self.manifest['favicon.ico'])
+            self.assertEqual(url_for('static', filename='missing.txt'), '/static/missing.txt')
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertIn(self.manifest['vendor/bootstrap/css/bootstrap.min.css'], page)
+        self.assertIn(self.manifest[MOMENT], page)
+        self.assertNotIn('cdnjs', page)
+
+    def test_precompressed_variant_is_served(self):
+        path = '/static/' + self.manifest['vendor/jquery/jquery.min.js']
+        response = self.client.get(path, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Cache-Control'], IMMUTABLE)
+        self.assertIn('javascript', response.mimetype)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        plain = self.client.get(path)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(gzip.decompress(response.get_data()), plain.get_data())
+        response.close()
+        plain.close()
+
+    def test_brotli_variant_is_preferred(self):
+        path = '/static/' + self.manifest['vendor/jquery/jquery.min.js']
+        response = self.client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        plain = self.client.get(path)
+        self.assertEqual(brotli.decompress(response.get_data()), plain.get_data())
+        response.close()
+        plain.close()
+
+    def test_build_without_brotli_writes_gzip_only(self):
+        static = os.path.join(self.directory.name, 'static-gzip')
+        shutil.copytree(self.app.static_folder, static, ignore=shutil.ignore_patterns('dist'))
+        with mock.patch('application.assets.brotli', None):
+            manifest = build(static, echo=lambda line: None)
+        script = os.path.join(static, manifest['vendor/jquery/jquery.min.js'])
+        self.assertTrue(os.path.exists(script + '.gz'))
+        self.assertFalse(os.path.exists(script + '.br'))
+
+    def test_original_names_are_still_served(self):
+        response = self.client.get('/static/favicon.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers.get('Cache-Control'), IMMUTABLE)
+        response.close()
@@ -4,22 +4,11 @@
 
 import unittest
 from flask import current_app
-from application import create_app, db
 from application.models import User
+from tests.database import DatabaseTestCase
 
 
-class BasicsTestCase(unittest.TestCase):
-    def setUp(self):
-        self.app = create_app('testing')
-        self.app_context = self.app.app_context()
-        self.app_context.push()
-        db.create_all()
-
-    def tearDown(self):
-        db.session.remove()
-        db.drop_all()
-        self.app_context.pop()
-
+class BasicsTestCase(DatabaseTestCase):
     def test_app_exists(self):
         self.assertFalse(current_app is None)
 
@@ -0,0 +1,27 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+from benchmarks import runner
+from tests.database import DatabaseTestCase
+
+
+class BenchmarkRunnerTestCase(DatabaseTestCase):
+    def test_summarize(self):
+        result = runner.summarize([0.001 * step for step in range(1, 21)])
+        self.assertAlmostEqual(result['median'], 0.0105)
+        self.assertAlmostEqual(result['p95'], 0.019)
+        self.assertAlmostEqual(result['ops_per_second'], 1 / 0.0105)
+
+    def test_run_save_and_compare(self):
+        results = runner.run(self.app, 'token.reset', min_time=0.01, samples=3, echo=lambda line: None)
+        self.assertEqual(set(results), {'token.reset.generate', 'token.reset.verify', 'token.reset.reject',
+                                        'token.reset.apply'})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            runner.save(results, path)
+            self.assertEqual(runner.compare(results, path), [])
+            slower = {name: dict(result, median=result['median'] * 2) for name, result in results.items()}
+            self.assertEqual(len(runner.compare(slower, path, threshold=0.5)), 4)
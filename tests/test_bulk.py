@@ -0,0 +1,65 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import io
+import json
+from werkzeug.security import generate_password_hash
+from application import db
+from application.bulk import export_users, import_users, read_rows
+from application.models import Role, User
+from tests.database import DatabaseTestCase
+
+HASH = generate_password_hash('dog')
+USERS = '''email,username,password,password_hash,confirmed,role
+john@example.com,john,cat,,true,Admin
+Susan@Example.com,susan,,%s,false,
+john@example.com,johnny,cat,,true,
+mary@example.com,john,cat,,true,
+''' % HASH
+
+
+class BulkUsersTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = Role(name='Admin')
+        db.session.add(self.admin)
+        db.session.commit()
+
+    def import_csv(self, text, batch_size=2):
+        return import_users(read_rows(io.StringIO(text), 'csv'), batch_size, echo=lambda line: None)
+
+    def test_import_hashes_passwords_and_skips_taken_users(self):
+        self.assertEqual(self.import_csv(USERS), (2, 2))
+        john = User.find_by_email('john@example.com')
+        self.assertTrue(john.verify_password('cat'))
+        self.assertTrue(john.confirmed)
+        self.assertEqual(john.role, self.admin)
+        susan = User.find_by_email('susan@example.com')
+        self.assertEqual(susan.password_hash, HASH)
+        self.assertFalse(susan.confirmed)
+        self.assertEqual(self.import_csv(USERS), (0, 4))
+
+    def test_unknown_role_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.import_csv('email,username,role\njane@example.com,jane,Moderator\n')
+
+    def test_export_round_trip(self):
+        self.import_csv(USERS)
+        exported = io.StringIO()
+        self.assertEqual(export_users(exported, 'jsonl', batch_size=1, echo=lambda line: None), 2)
+        rows = [json.loads(line) for line in exported.getvalue().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['john', 'susan'])
+        self.assertEqual(rows[0]['role'], 'Admin')
+        User.query.delete()
+        db.session.commit()
+        imported = import_users(read_rows(io.StringIO(exported.getvalue()), 'jsonl'), echo=lambda line: None)
+        self.assertEqual(imported, (2, 0))
+        self.assertTrue(User.find_by_email('john@example.com').verify_password('cat'))
+
+    def test_users_imported_without_a_password_cannot_log_in(self):
+        self.assertEqual(self.import_csv('email,username\njane@example.com,jane\n'), (1, 0))
+        self.assertFalse(User.find_by_email('jane@example.com').verify_password(''))
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        response = self.app.test_client().post('/auth/login', data={'email': 'jane@example.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
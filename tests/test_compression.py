@@ -0,0 +1,102 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import brotli
+import gzip
+import unittest
+from unittest import mock
+import zlib
+from flask import Flask, Response
+from werkzeug.test import Client, create_environ
+from werkzeug.wrappers import BaseResponse
+from application import create_app
+from application.compression import CompressionMiddleware
+
+PAGE = '<p>Hello!</p>' * 100
+
+
+def create_test_app():
+    app = Flask(__name__)
+    app.add_url_rule('/page', 'page', lambda: PAGE)
+    app.add_url_rule('/small', 'small', lambda: '<p>Hi</p>')
+    app.add_url_rule('/private', 'private', lambda: Response(PAGE, mimetype='text/html',
+                                                             headers={'Cache-Control': 'private'}))
+    app.add_url_rule('/data', 'data', lambda: Response(b'\0' * 1000, mimetype='application/octet-stream'))
+    app.add_url_rule('/encoded', 'encoded', lambda: Response(gzip.compress(PAGE.encode()),
+                                                             headers={'Content-Encoding': 'gzip'}))
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, minimum_size=500)
+    return app
+
+
+class CompressionMiddlewareTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = create_test_app().test_client()
+
+    def get(self, path, **headers):
+        return self.client.get(path, headers=dict({'Accept-Encoding': 'gzip, deflate'}, **headers))
+
+    def test_large_html_is_compressed(self):
+        response = self.get('/page')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(gzip.decompress(response.get_data()).decode(), PAGE)
+
+    def test_brotli_is_preferred_when_installed(self):
+        response = self.get('/page', **{'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.get_data()).decode(), PAGE)
+        with mock.patch('application.compression.brotli', None):
+            client = create_test_app().test_client()
+        response = client.get('/page', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+
+    def test_skipped_responses(self):
+        self.assertNotIn('Content-Encoding', self.get('/small').headers)
+        self.assertNotIn('Content-Encoding', self.get('/data').headers)
+        self.assertNotIn('Content-Encoding', self.client.get('/page').headers)
+        self.assertNotIn('Content-Encoding', self.get('/page', **{'Accept-Encoding': 'gzip;q=0'}).headers)
+        self.assertNotIn('Content-Encoding', self.get('/private').headers)
+        response = self.get('/encoded')
+        self.assertEqual(gzip.decompress(response.get_data()).decode(), PAGE)
+
+    def test_body_is_streamed(self):
+        produced = []
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/html')])
+            for number in range(3):
+                produced.append(number)
+                yield PAGE.encode()
+
+        environ = create_environ('/', headers={'Accept-Encoding': 'gzip'})
+        body = CompressionMiddleware(app)(environ, lambda status, headers, exc_info=None: None)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(next(body)).decode(), PAGE)
+        self.assertEqual(produced, [0])
+        self.assertEqual(decompressor.decompress(b''.join(body)).decode(), PAGE * 2)
+
+
+class CompressedPagesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.client = Client(self.app, BaseResponse)
+
+    def test_etag_gets_encoding_suffix(self):
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        etag = response.headers['ETag']
+        self.assertTrue(etag.endswith('-gzip"'))
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertIn('Cookie', response.headers['Vary'])
+        revalidated = self.client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.headers['ETag'], etag)
+        self.assertNotIn('-gzip', self.client.get('/').headers['ETag'])
+
+    def test_pages_with_a_csrf_token_are_not_compressed(self):
+        response = self.client.get('/auth/login', headers={'Accept-Encoding': 'gzip'})
+        self.assertIn('csrf_token', response.get_data(as_text=True))
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertNotIn('Content-Encoding', response.headers)
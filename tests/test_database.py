@@ -0,0 +1,44 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from application import db
+from application.models import User
+from tests.database import DatabaseTestCase, copy_database, schema_template
+from tests.parallel import discover_modules
+
+
+class DatabaseTestCaseTestCase(DatabaseTestCase):
+    def test_commits_are_rolled_back(self):
+        db.session.add(User(email='john@example.com', username='john', password='cat'))
+        db.session.commit()
+        db.session.add(User(email='susan@example.com', username='susan', password='dog'))
+        db.session.rollback()
+        self.assertEqual(User.query.count(), 1)
+        self.tearDown()
+        self.setUp()
+        self.assertEqual(User.query.count(), 0)
+
+    def test_session_can_be_removed(self):
+        db.session.add(User(email='john@example.com', username='john', password='cat'))
+        db.session.commit()
+        db.session.remove()
+        self.assertEqual(User.query.one().username, 'john')
+
+
+class SchemaTemplateTestCase(unittest.TestCase):
+    def test_copy_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'copy.sqlite')
+            copy_database(schema_template(), path)
+            connection = sqlite3.connect(path)
+            tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            connection.close()
+        self.assertTrue({'users', 'roles', 'outbox'} <= tables)
+
+    def test_discover_modules(self):
+        self.assertIn('tests.test_database', discover_modules())
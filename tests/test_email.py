@@ -0,0 +1,271 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import queue
+import socketserver
+import threading
+import unittest
+from unittest import mock
+from datetime import datetime
+
+from flask_mail import Message
+
+from application import create_app, db, mail
+from application.email import CampaignInterrupted, send_email, deliver_outbox, resend_confirmations
+from application.models import User, Outbox
+from tests.database import DatabaseTestCase
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP dialogue, enough for smtplib to deliver messages."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.messages += 1
+                self.reply('250 OK')
+            elif command == b'EHLO':
+                self.reply('250 localhost')
+            elif command == b'RCPT' and line.decode('ascii').split('<')[-1].rstrip('>\r\n') in self.server.refused:
+                self.reply('550 Refused')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = 0
+        self.refused = set()
+
+
+class MailDispatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = SMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.app = create_app('testing')
+        self.app.config.update(MAIL_SERVER='127.0.0.1',
+                               MAIL_PORT=self.server.server_address[1],
+                               MAIL_USE_TLS=False,
+                               MAIL_SUPPRESS_SEND=False,
+                               MAIL_WORKERS=2,
+                               MAIL_QUEUE_SIZE=2)
+        mail.init_app(self.app)
+        self.dispatcher = self.app.extensions['mail_dispatcher']
+        self.dispatcher.init_app(self.app)
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def message(self):
+        return Message('Hello', sender='admin@example.com', recipients=['user@example.com'], body='Hi')
+
+    def test_connections_are_reused(self):
+        for _ in range(10):
+            self.dispatcher.submit(self.message())
+        self.dispatcher.join()
+        self.assertEqual(self.server.messages, 10)
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_shutdown_drains_queue(self):
+        for _ in range(4):
+            self.dispatcher.submit(self.message())
+        self.dispatcher.shutdown()
+        self.assertEqual(self.server.messages, 4)
+        self.assertFalse(self.dispatcher.running)
+
+    def test_bad_message_does_not_stop_the_worker(self):
+        self.dispatcher.app.config['MAIL_WORKERS'] = 1
+        bad = Message('Hello', sender='admin@example.com', recipients=['bad\nuser@example.com'], body='Hi')
+        self.dispatcher.submit(bad)
+        self.dispatcher.submit(self.message())
+        self.dispatcher.join()
+        self.assertEqual(self.server.messages, 1)
+        self.assertTrue(all(worker.is_alive() for worker in self.dispatcher._workers))
+
+    def test_full_queue_applies_backpressure(self):
+        self.dispatcher.app.config['MAIL_WORKERS'] = 0
+        self.dispatcher.start()
+        self.dispatcher.submit(self.message())
+        self.dispatcher.submit(self.message())
+        with self.assertRaises(queue.Full):
+            self.dispatcher.submit(self.message(), timeout=0.01)
+
+
+class OutboxTestCase(DatabaseTestCase):
+    def setUp(self):
+        self.server = SMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        super().setUp()
+        self.app.config.update(MAIL_SERVER='127.0.0.1',
+                               MAIL_PORT=self.server.server_address[1],
+                               MAIL_USE_TLS=False,
+                               MAIL_SUPPRESS_SEND=False,
+                               APP_MAIL_SENDER=('Admin', 'admin@example.com'))
+        mail.init_app(self.app)
+
+    def tearDown(self):
+        super().tearDown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def queue_confirmation(self):
+        user = User(email='john@example.com', username='john', password='cat')
+        db.session.add(user)
+        db.session.flush()
+        with self.app.test_request_context(base_url='http://example.com/'):
+            send_email('Confirm your account', user.email, 'auth/email/confirm', user=user, token='abc')
+        db.session.commit()
+
+    def test_send_email_writes_outbox_row(self):
+        self.queue_confirmation()
+        row = Outbox.query.one()
+        self.assertEqual(row.status, 'pending')
+        self.assertEqual(self.server.messages, 0)
+
+    def test_rollback_discards_email(self):
+        user = User(email='john@example.com', username='john', password='cat')
+        db.session.add(user)
+        send_email('Confirm your account', user.email, 'auth/email/confirm', user=user, token='abc')
+        db.session.rollback()
+        self.assertEqual(Outbox.query.count(), 0)
+
+    def test_deliver_outbox(self):
+        self.queue_confirmation()
+        self.assertEqual(deliver_outbox(), 1)
+        row = Outbox.query.one()
+        self.assertEqual(row.status, 'sent')
+        self.assertEqual(self.server.messages, 1)
+        self.assertEqual(deliver_outbox(), 0)
+
+    def test_poison_row_does_not_hold_back_the_batch(self):
+        self.queue_confirmation()
+        poison = Outbox(subject='Hi', recipient='bad\nrecipient@example.com', template_name='auth/email/confirm',
+                        context='{"user": {"__model__": "User", "id": 1}, "token": "abc"}')
+        db.session.add(poison)
+        db.session.commit()
+        self.assertEqual(deliver_outbox(), 2)
+        self.assertEqual(self.server.messages, 1)
+        statuses = {row.recipient: (row.status, row.attempts) for row in Outbox.query}
+        self.assertEqual(statuses['john@example.com'], ('sent', 0))
+        self.assertEqual(statuses[poison.recipient], ('pending', 1))
+        self.assertEqual(deliver_outbox(), 0)
+
+    def test_refused_recipient_does_not_fail_the_batch(self):
+        user = User(email='john@example.com', username='john', password='cat')
+        db.session.add(user)
+        db.session.flush()
+        with self.app.test_request_context(base_url='http://example.com/'):
+            for recipient in ('john@example.com', 'refused@example.com', 'mary@example.com'):
+                send_email('Confirm your account', recipient, 'auth/email/confirm', user=user, token='abc')
+        db.session.commit()
+        self.server.refused.add('refused@example.com')
+        self.assertEqual(deliver_outbox(), 3)
+        self.assertEqual(self.server.messages, 2)
+        statuses = {row.recipient: (row.status, row.attempts) for row in Outbox.query}
+        self.assertEqual(statuses['john@example.com'], ('sent', 0))
+        self.assertEqual(statuses['mary@example.com'], ('sent', 0))
+        self.assertEqual(statuses['refused@example.com'], ('pending', 1))
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.queue_confirmation()
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertEqual(deliver_outbox(), 1)
+        row = Outbox.query.one()
+        self.assertEqual(row.status, 'pending')
+        self.assertEqual(row.attempts, 1)
+        self.assertGreater(row.next_attempt_at, datetime.utcnow())
+        self.assertEqual(deliver_outbox(), 0)
+
+
+class ResendConfirmationsTestCase(DatabaseTestCase):
+    def setUp(self):
+        self.server = SMTPServer()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        super().setUp()
+        self.app.config.update(MAIL_SERVER='127.0.0.1',
+                               MAIL_PORT=self.server.server_address[1],
+                               MAIL_USE_TLS=False,
+                               MAIL_SUPPRESS_SEND=False,
+                               MAIL_WORKERS=2,
+                               APP_MAIL_SENDER=('Admin', 'admin@example.com'))
+        mail.init_app(self.app)
+        for number in range(5):
+            db.session.add(User(email='user%d@example.com' % number, username='user%d' % number,
+                                confirmed=number in (1, 3)))
+        db.session.commit()
+
+    def tearDown(self):
+        self.app.extensions['mail_dispatcher'].shutdown()
+        super().tearDown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def resend(self, **kwargs):
+        return resend_confirmations('http://example.com/', batch_size=2, rate=0, echo=lambda line: None, **kwargs)
+
+    def test_unconfirmed_users_are_mailed_over_kept_connections(self):
+        last_id = max(user.id for user in User.query)
+        self.assertEqual(self.resend(), (3, last_id))
+        self.assertEqual(self.server.messages, 3)
+        self.assertLessEqual(self.server.connections, 2)
+        self.assertEqual(self.resend(after_id=last_id), (0, last_id))
+
+    def test_dry_run_and_resume(self):
+        users = User.query.filter_by(confirmed=False).order_by(User.id).all()
+        self.assertEqual(self.resend(dry_run=True), (3, users[-1].id))
+        self.assertEqual(self.server.messages, 0)
+        self.assertEqual(self.resend(after_id=users[0].id), (2, users[-1].id))
+        self.assertEqual(self.server.messages, 2)
+
+    def test_campaign_stops_at_the_first_undelivered_email(self):
+        users = User.query.filter_by(confirmed=False).order_by(User.id).all()
+        self.server.refused.add('user2@example.com')
+        with self.assertRaises(CampaignInterrupted) as raised:
+            self.resend()
+        self.assertEqual((raised.exception.sent, raised.exception.after_id), (1, users[0].id))
+        self.assertEqual(raised.exception.user_id, users[1].id)
+        self.server.refused.clear()
+        self.assertEqual(self.resend(after_id=raised.exception.after_id), (2, users[-1].id))
+
+    def test_full_queue_interrupts_the_campaign(self):
+        users = User.query.filter_by(confirmed=False).order_by(User.id).all()
+        dispatcher = self.app.extensions['mail_dispatcher']
+        submitted = []
+
+        def submit(msg, timeout=None):
+            if submitted:
+                raise queue.Full
+            submitted.append(msg)
+            return dispatcher.__class__.submit(dispatcher, msg, timeout)
+
+        with mock.patch.object(dispatcher, 'submit', side_effect=submit):
+            with self.assertRaises(CampaignInterrupted) as raised:
+                self.resend()
+        self.assertEqual((raised.exception.sent, raised.exception.after_id), (1, users[0].id))
+        self.assertEqual(raised.exception.user_id, users[1].id)
+        self.assertIn('Full', str(raised.exception))
+        self.assertEqual(self.server.messages, 1)
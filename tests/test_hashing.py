@@ -0,0 +1,44 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import unittest
+from werkzeug.security import generate_password_hash
+from application import create_app, hasher
+from application.models import User
+
+
+class PasswordHasherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app('testing')
+        self.app.config['APP_PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_configured_method_is_used(self):
+        user = User(password='secret')
+        self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertFalse(hasher.needs_rehash(user.password_hash))
+
+    def test_outdated_hash_needs_rehash(self):
+        self.assertTrue(hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000')))
+        self.assertTrue(hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:2000', 16)))
+
+    def test_verify_password_rehashes_outdated_hash(self):
+        user = User(password_hash=generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+        self.assertFalse(user.verify_password('not secret'))
+        self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:1000$'))
+        self.assertTrue(user.verify_password('secret'))
+        self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertTrue(user.verify_password('secret'))
+
+    def test_process_pool(self):
+        self.app.config['APP_PASSWORD_HASH_WORKERS'] = 1
+        try:
+            user = User(password='secret')
+            self.assertTrue(user.verify_password('secret'))
+        finally:
+            hasher.shutdown()
@@ -0,0 +1,70 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+from application import db
+from application.models import User, load_user, identity_cache
+from tests.database import DatabaseTestCase
+from tests.query_budget import QueryBudget
+
+
+class IdentityCacheTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User(email='john@example.com', username='john', password='cat')
+        db.session.add(self.user)
+        db.session.commit()
+        self.user_id = self.user.id
+        db.session.remove()
+
+    def test_second_load_is_a_hit(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        user = load_user(str(self.user_id))
+        stats = identity_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(user.username, 'john')
+        self.assertTrue(user.verify_password('cat'))
+
+    def test_cached_user_can_be_updated(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        user = load_user(str(self.user_id))
+        user.password = 'dog'
+        db.session.add(user)
+        db.session.commit()
+        db.session.remove()
+        self.assertNotIn(self.user_id, identity_cache())
+        self.assertTrue(load_user(str(self.user_id)).verify_password('dog'))
+
+    def test_password_is_verified_against_the_stored_hash(self):
+        load_user(str(self.user_id))
+        db.session.remove()
+        # Changed by another process, whose commit does not reach this cache
+        User.query.filter_by(id=self.user_id).update({'password_hash': User(password='dog').password_hash})
+        db.session.commit()
+        user = load_user(str(self.user_id))
+        self.assertIn(self.user_id, identity_cache())
+        with QueryBudget(1):
+            self.assertFalse(user.verify_password('cat'))
+        self.assertTrue(user.verify_password('dog'))
+
+    def test_confirmation_invalidates_on_commit(self):
+        user = load_user(str(self.user_id))
+        token = user.generate_confirmation_token()
+        self.assertTrue(user.confirm_generated_token(token))
+        self.assertIn(self.user_id, identity_cache())
+        db.session.commit()
+        self.assertNotIn(self.user_id, identity_cache())
+        db.session.remove()
+        self.assertTrue(load_user(str(self.user_id)).confirmed)
+
+    def test_rollback_keeps_cache(self):
+        user = load_user(str(self.user_id))
+        user.confirmed = True
+        db.session.flush()
+        db.session.rollback()
+        self.assertIn(self.user_id, identity_cache())
+
+    def test_unknown_user(self):
+        self.assertIsNone(load_user('42'))
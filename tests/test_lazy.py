@@ -0,0 +1,76 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import unittest
+from flask import Flask, render_template_string
+from application.lazy import LazyExtension
+from benchmarks.startup import by_package, parse_importtime
+
+EXTENSION = '''
+initialized = []
+
+
+class Extension:
+    def init_app(self, app):
+        initialized.append(app)
+        app.extensions['sample'] = self
+
+    def greet(self):
+        return 'hello'
+'''
+
+
+class LazyExtensionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, 'lazy_sample.py'), 'w') as file:
+            file.write(EXTENSION)
+        sys.path.insert(0, self.directory.name)
+        self.extension = LazyExtension('lazy_sample', 'Extension', template_global='sample')
+        self.app = Flask(__name__)
+        self.app.config['APP_LAZY_EXTENSIONS'] = True
+
+    def tearDown(self):
+        sys.path.remove(self.directory.name)
+        sys.modules.pop('lazy_sample', None)
+        self.directory.cleanup()
+
+    def test_initialized_on_first_use(self):
+        self.extension.init_app(self.app)
+        self.assertNotIn('lazy_sample', sys.modules)
+        with self.app.app_context():
+            self.assertEqual(self.extension.greet(), 'hello')
+            self.assertEqual(self.extension.greet(), 'hello')
+        self.assertEqual(sys.modules['lazy_sample'].initialized, [self.app])
+
+    def test_template_global(self):
+        self.extension.init_app(self.app)
+        with self.app.app_context():
+            self.assertEqual(render_template_string('{{ sample.greet() }}'), 'hello')
+        self.assertIn('sample', self.app.extensions)
+
+    def test_eager_when_disabled_or_imported(self):
+        self.app.config['APP_LAZY_EXTENSIONS'] = False
+        self.extension.init_app(self.app)
+        self.assertEqual(sys.modules['lazy_sample'].initialized, [self.app])
+        other = Flask(__name__)
+        other.config['APP_LAZY_EXTENSIONS'] = True
+        self.extension.init_app(other)
+        self.extension.init_app(other)
+        self.assertEqual(sys.modules['lazy_sample'].initialized, [self.app, other, other])
+
+
+class StartupProfileTestCase(unittest.TestCase):
+    def test_parse_importtime(self):
+        modules = parse_importtime(['import time: self [us] | cumulative | imported package',
+                                    'import time:       120 |        120 |   jinja2.utils',
+                                    'import time:       300 |        420 | jinja2',
+                                    'something else'])
+        self.assertEqual(modules, [('jinja2.utils', 0.00012, 0.00012), ('jinja2', 0.0003, 0.00042)])
+        (package, seconds), = by_package(modules)
+        self.assertEqual(package, 'jinja2')
+        self.assertAlmostEqual(seconds, 0.00042)
@@ -0,0 +1,25 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import unittest
+from benchmarks import loadtest
+
+
+class LoadTestTestCase(unittest.TestCase):
+    def test_in_process_run(self):
+        app = loadtest.create_target_app()
+        users = loadtest.seed_users(app, 10, batch_size=4, echo=lambda line: None)
+        self.assertEqual(len(users), 10)
+        recorder, elapsed = loadtest.run(lambda: loadtest.InProcessClient(app),
+                                         users,
+                                         clients=2,
+                                         iterations=3,
+                                         mix='index=1,login=1,confirm=1,reset=1')
+        self.assertEqual(sum(recorder.errors.values()), 0)
+        self.assertIn('POST auth.login', ''.join(loadtest.report(recorder, elapsed)))
+
+    def test_parse_mix(self):
+        self.assertEqual(loadtest.parse_mix('index=3,login'), {'index': 3.0, 'login': 1.0})
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('crawl=1')
@@ -0,0 +1,67 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import threading
+import unittest
+from application.metrics import MetricsRegistry
+from application.models import User
+from tests.database import DatabaseTestCase
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            registry.observe('latency', value, endpoint='x')
+        text = registry.render()
+        self.assertIn('latency_bucket{endpoint="x",le="0.1"} 1', text)
+        self.assertIn('latency_bucket{endpoint="x",le="1.0"} 2', text)
+        self.assertIn('latency_bucket{endpoint="x",le="+Inf"} 3', text)
+        self.assertIn('latency_count{endpoint="x"} 3', text)
+
+    def test_thread_buffers_are_merged(self):
+        registry = MetricsRegistry()
+        threads = [threading.Thread(target=lambda: [registry.inc('hits') for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn('hits 400', registry.render())
+
+    def test_buffers_of_exited_threads_are_retired(self):
+        registry = MetricsRegistry()
+        registry.observe('latency', 0.003)
+        for _ in range(3):
+            thread = threading.Thread(target=lambda: registry.observe('latency', 0.003))
+            thread.start()
+            thread.join()
+        self.assertIn('latency_count 4', registry.render())
+        self.assertEqual(len(registry._buffers), 1)
+        registry.observe('latency', 0.003)
+        self.assertIn('latency_count 5', registry.render())
+
+
+class MetricsEndpointTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+
+    def test_requests_are_recorded(self):
+        self.client.get('/')
+        self.client.get('/missing')
+        User(password='cat')
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('http_requests_total{endpoint="main.index",status="200"} 1', text)
+        self.assertIn('http_requests_total{endpoint="none",status="404"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{endpoint="main.index"} 1', text)
+        self.assertIn('template_render_duration_seconds_count{template="index.html"} 1', text)
+        self.assertIn('password_hash_duration_seconds_count{operation="generate_password_hash"} 1', text)
+
+    def test_sql_statements_are_counted(self):
+        with self.app.test_request_context('/'):
+            self.app.preprocess_request()
+            User.query.all()
+            self.app.do_teardown_request()
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('db_statements_total{endpoint="main.index"} 1', text)
@@ -0,0 +1,103 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+import time
+import unittest
+from flask import template_rendered
+from application import db, page_cache
+from application.cache import SQLiteCache
+from application.models import User
+from tests.database import DatabaseTestCase
+
+
+class PageCacheTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.app.test_client()
+        self.rendered = []
+        template_rendered.connect(self.record, self.app)
+
+    def tearDown(self):
+        template_rendered.disconnect(self.record, self.app)
+        super().tearDown()
+
+    def record(self, app, template, context, **extra):
+        self.rendered.append(template.name)
+
+    def test_anonymous_page_is_rendered_once(self):
+        first = self.client.get('/')
+        second = self.client.get('/')
+        self.assertEqual(self.rendered, ['index.html'])
+        self.assertEqual(first.get_data(), second.get_data())
+        self.assertEqual(first.headers['ETag'], second.headers['ETag'])
+        self.assertFalse(first.headers['ETag'].startswith('W/'))
+
+    def test_matching_etag_gets_304(self):
+        etag = self.client.get('/').headers['ETag']
+        response = self.client.get('/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+        self.assertEqual(self.client.get('/', headers={'If-None-Match': '"other"'}).status_code, 200)
+
+    def test_flashed_messages_bypass_the_cache(self):
+        self.client.get('/')
+        with self.client.session_transaction() as session:
+            session['_flashes'] = [('message', 'You have been logged out.')]
+        self.assertIn('You have been logged out.', self.client.get('/').get_data(as_text=True))
+        self.assertNotIn('You have been logged out.', self.client.get('/').get_data(as_text=True))
+        self.assertEqual(self.rendered, ['index.html', 'index.html'])
+
+    def test_authenticated_users_bypass_the_cache(self):
+        self.client.get('/')
+        db.session.add(User(email='john@example.com', username='john', password='cat', confirmed=True))
+        db.session.commit()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+        response = self.client.get('/')
+        self.assertIn('Welcome back', response.get_data(as_text=True))
+        self.assertNotIn('ETag', response.headers)
+
+    def test_not_found_page_is_cached_with_its_status(self):
+        self.assertEqual(self.client.get('/missing').status_code, 404)
+        response = self.client.get('/other-missing')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.rendered, ['errors/404.html'])
+        self.assertEqual(self.client.get('/missing', headers={'If-None-Match': response.headers['ETag']}).status_code,
+                         404)
+
+    def test_disabled(self):
+        self.app.extensions.pop('page_cache')
+        self.client.get('/')
+        self.client.get('/')
+        self.assertEqual(self.rendered, ['index.html', 'index.html'])
+        self.assertIsNone(page_cache.backend())
+
+
+class SQLiteCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_values_are_shared(self):
+        SQLiteCache(self.path).set('page', (200, [('Content-Type', 'text/html')], b'<html>', 'abc'))
+        cache = SQLiteCache(self.path)
+        self.assertEqual(cache.get('page'), (200, [('Content-Type', 'text/html')], b'<html>', 'abc'))
+        self.assertIn('page', cache)
+        cache.delete('page')
+        self.assertIsNone(cache.get('page'))
+        self.assertEqual(cache.stats(), dict(size=0, hits=1, misses=1))
+
+    def test_entries_expire(self):
+        cache = SQLiteCache(self.path, ttl=0.05)
+        cache.set('page', 'body')
+        self.assertEqual(cache.get('page'), 'body')
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('page'))
+        cache.set('other', 'body')
+        self.assertEqual(len(cache), 1)
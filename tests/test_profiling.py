@@ -0,0 +1,71 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from flask import Flask
+from application import profiling
+from application.profiling import Profiler, dumps, generate_profile_token, report, rotate
+
+
+def slow_view():
+    return str(sum(number * number for number in range(20000)))
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = Flask(__name__)
+        self.app.config.update(SECRET_KEY='secret', APP_PROFILE=True, APP_PROFILE_DIR=self.directory.name)
+        self.app.add_url_rule('/slow', 'slow', slow_view)
+        Profiler(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_only_sampled_or_signed_requests_are_profiled(self):
+        self.assertNotIn('X-Profile-Id', self.client.get('/slow').headers)
+        self.assertNotIn('X-Profile-Id', self.client.get('/slow', headers={'X-Profile': 'forged'}).headers)
+        self.assertEqual(dumps(self.directory.name), [])
+        with self.app.app_context():
+            token = generate_profile_token()
+        response = self.client.get('/slow', headers={'X-Profile': token})
+        path = os.path.join(self.directory.name, 'slow', response.headers['X-Profile-Id'])
+        self.assertTrue(os.path.exists(path))
+        self.app.config['APP_PROFILE_RATE'] = 1.0
+        self.client.get('/slow')
+        self.assertEqual(len(dumps(self.directory.name)), 2)
+
+    def test_report_merges_dumps_per_endpoint(self):
+        self.app.config['APP_PROFILE_RATE'] = 1.0
+        for _ in range(3):
+            self.client.get('/slow')
+        lines = report(self.directory.name, top=10, sort='cumtime')
+        self.assertTrue(lines[0].startswith('slow: 3 requests'))
+        self.assertTrue(any('slow_view' in line for line in lines))
+        self.assertEqual(report(self.directory.name, endpoint='index'), [])
+
+    def test_rotate_removes_the_oldest(self):
+        self.app.config['APP_PROFILE_RATE'] = 1.0
+        for _ in range(3):
+            self.client.get('/slow')
+        found = sorted(dumps(self.directory.name), key=lambda dump: dump[2])
+        for number, (path, size, modified) in enumerate(found):
+            os.utime(path, (number, number))
+        rotate(self.directory.name, found[-1][1])
+        self.assertEqual([path for path, size, modified in dumps(self.directory.name)], [found[-1][0]])
+
+    def test_directory_is_scanned_only_when_due(self):
+        self.app.config['APP_PROFILE_RATE'] = 1.0
+        with mock.patch.object(profiling, 'rotate', wraps=rotate) as scan:
+            for _ in range(3):
+                self.client.get('/slow')
+            self.assertEqual(scan.call_count, 1)
+            self.app.config['APP_PROFILE_MAX_BYTES'] = 1
+            self.client.get('/slow')
+            self.assertEqual(scan.call_count, 2)
+        self.assertEqual(dumps(self.directory.name), [])
@@ -0,0 +1,63 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+from application import db
+from application.models import User
+from tests.database import DatabaseTestCase
+from tests.query_budget import QueryBudget
+
+
+class QueryBudgetTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.user = User(email='john@example.com', username='john', password='cat')
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def login(self):
+        return self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+
+    def test_budget_exceeded(self):
+        with self.assertRaises(AssertionError):
+            with QueryBudget(1):
+                User.query.filter_by(username='john').first()
+                User.query.filter_by(email='john@example.com').first()
+
+    def test_repeated_statement_is_flagged(self):
+        with self.assertRaisesRegex(AssertionError, 'repeated'):
+            with QueryBudget(10):
+                for user_id in range(3):
+                    User.query.get(user_id + 100)
+
+    def test_decorator(self):
+        @QueryBudget(0)
+        def no_queries():
+            User.query.all()
+
+        with self.assertRaises(AssertionError):
+            no_queries()
+
+    def test_main_index(self):
+        with QueryBudget(0):
+            self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_login(self):
+        with QueryBudget(1):
+            self.assertEqual(self.login().status_code, 302)
+
+    def test_register(self):
+        data = {'email': 'susan@example.com', 'username': 'susan', 'password': 'dog', 'password_confirm': 'dog'}
+        with QueryBudget(3):
+            self.assertEqual(self.client.post('/auth/register', data=data).status_code, 302)
+
+    def test_confirm(self):
+        self.login()
+        token = self.user.generate_confirmation_token()
+        db.session.remove()
+        with QueryBudget(2):
+            response = self.client.get('/auth/confirm/' + token)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(User.query.get(self.user.id).confirmed)
@@ -0,0 +1,93 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+from flask import request
+from application import create_app, db
+from application.models import User
+from application.ratelimit import MemoryBucketStore, SQLiteBucketStore, parse_limit
+from config import TestingConfig
+from tests.database import DatabaseTestCase
+
+
+class BucketStoreTestCase(unittest.TestCase):
+    def check_store(self, store):
+        capacity, rate = parse_limit('2/minute')
+        self.assertEqual(store.consume('key', capacity, rate, now=0), 0)
+        self.assertEqual(store.consume('key', capacity, rate, now=0), 0)
+        self.assertAlmostEqual(store.consume('key', capacity, rate, now=0), 30)
+        self.assertAlmostEqual(store.consume('key', capacity, rate, now=20), 10)
+        self.assertEqual(store.consume('other', capacity, rate, now=20), 0)
+        self.assertEqual(store.consume('key', capacity, rate, now=30), 0)
+
+    def test_memory_store(self):
+        self.check_store(MemoryBucketStore())
+
+    def test_memory_store_forgets_the_least_recently_used(self):
+        store = MemoryBucketStore(max_size=2)
+        for key in ('a', 'b', 'a', 'c'):
+            store.consume(key, 1, 1 / 60, now=0)
+        self.assertEqual(list(store._buckets), ['a', 'c'])
+        self.assertGreater(store.consume('a', 1, 1 / 60, now=0), 0)
+
+    def test_sqlite_store_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'limits.sqlite')
+            self.check_store(SQLiteBucketStore(path))
+            self.assertGreater(SQLiteBucketStore(path).consume('key', 2, 1 / 30, now=30), 0)
+
+
+class ProxyHopsTestCase(unittest.TestCase):
+    def remote_address(self, hops):
+        with mock.patch.object(TestingConfig, 'APP_PROXY_HOPS', hops):
+            app = create_app('testing')
+        app.add_url_rule('/address', 'address', lambda: request.remote_addr)
+        response = app.test_client().get('/address', headers={'X-Forwarded-For': '10.0.0.2'},
+                                         environ_base={'REMOTE_ADDR': '127.0.0.1'})
+        return response.get_data(as_text=True)
+
+    def test_client_address_behind_a_proxy(self):
+        self.assertEqual(self.remote_address(0), '127.0.0.1')
+        self.assertEqual(self.remote_address(1), '10.0.0.2')
+
+
+class RateLimitedViewsTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config.update(WTF_CSRF_ENABLED=False, APP_RATE_LIMIT=True)
+        self.app.extensions['rate_limiter'] = MemoryBucketStore()
+        db.session.add(User(email='john@example.com', username='john', password='cat', confirmed=True))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def test_login_is_limited_per_account_before_hashing(self):
+        for _ in range(5):
+            response = self.client.post('/auth/login', data={'email': 'John@example.com', 'password': 'dog'})
+            self.assertEqual(response.status_code, 200)
+        with mock.patch.object(self.app.extensions['password_hasher'], 'check') as check:
+            response = self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+        self.assertEqual(response.status_code, 429)
+        check.assert_not_called()
+        self.assertGreater(int(response.headers['Retry-After']), 0)
+        self.assertIn('429 Too Many Requests', response.get_data(as_text=True))
+        self.assertEqual(self.client.get('/auth/login').status_code, 200)
+        response = self.client.post('/auth/login', data={'email': 'jane@example.com', 'password': 'cat'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_reset_request_is_limited_per_address(self):
+        statuses = [self.client.post('/auth/reset', data={'email': 'user%d@example.com' % number}).status_code
+                    for number in range(6)]
+        self.assertEqual(statuses, [302] * 5 + [429])
+        other = self.client.post('/auth/reset', data={'email': 'user0@example.com'},
+                                 environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        self.assertEqual(other.status_code, 302)
+
+    def test_availability_checks_are_limited_per_address(self):
+        statuses = [self.client.get('/auth/available?username=user%d' % number).status_code for number in range(31)]
+        self.assertEqual(statuses, [200] * 30 + [429])
+        other = self.client.get('/auth/available?username=jane', environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        self.assertEqual(other.status_code, 200)
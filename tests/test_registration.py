@@ -0,0 +1,126 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import unittest
+from unittest import mock
+from sqlalchemy.exc import IntegrityError
+from application import db
+from application.auth.availability import BloomFilter, availability_index
+from application.auth.forms import Registration
+from application.models import User
+from tests.database import DatabaseTestCase
+from tests.query_budget import QueryBudget
+
+
+class RegistrationTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        db.session.add(User(email='john@example.com', username='john', password='cat'))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def form(self, email, username):
+        data = {'email': email, 'username': username, 'password': 'dog', 'password_confirm': 'dog'}
+        return Registration(data=data)
+
+    def test_uniqueness_checked_in_one_query(self):
+        with self.app.test_request_context(method='POST'):
+            form = self.form('john@example.com', 'john')
+            with QueryBudget(1):
+                self.assertFalse(form.validate())
+            self.assertEqual(form.email.errors, ['Email already registered'])
+            self.assertEqual(form.username.errors, ['Username already used'])
+
+    def test_email_uniqueness_ignores_case(self):
+        with self.app.test_request_context(method='POST'):
+            form = self.form('John@Example.com', 'johnny')
+            self.assertFalse(form.validate())
+            self.assertEqual(form.email.errors, ['Email already registered'])
+        self.assertFalse(availability_index().is_available('email', 'JOHN@example.com'))
+
+    def test_login_and_reset_lookups_ignore_case(self):
+        self.assertEqual(User.find_by_email(' John@EXAMPLE.com').username, 'john')
+        response = self.client.post('/auth/login', data={'email': 'JOHN@example.com', 'password': 'cat'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_integrity_error_maps_to_field(self):
+        db.session.add(User(email='john@example.com', username='johnny'))
+        with self.assertRaises(IntegrityError) as context:
+            db.session.commit()
+        db.session.rollback()
+        with self.app.test_request_context(method='POST'):
+            form = self.form('john@example.com', 'johnny')
+            form.validate()
+            form.email.errors = []
+            self.assertTrue(form.unique_violation(context.exception))
+            self.assertEqual(form.email.errors, ['Email already registered'])
+
+    def test_availability_endpoint(self):
+        response = self.client.get('/auth/available?username=john&email=susan@example.com')
+        self.assertEqual(response.get_json(), {
+            'username': {'value': 'john', 'available': False},
+            'email': {'value': 'susan@example.com', 'available': True}
+        })
+        self.assertEqual(self.client.get('/auth/available').status_code, 400)
+
+    def test_registration_updates_availability(self):
+        availability_index().warm()
+        data = {'email': 'susan@example.com', 'username': 'susan', 'password': 'dog', 'password_confirm': 'dog'}
+        self.client.post('/auth/register', data=data)
+        self.assertFalse(availability_index().is_available('username', 'susan'))
+
+    def test_free_values_skip_the_database(self):
+        index = availability_index()
+        index.warm()
+        with QueryBudget(0):
+            for number in range(50):
+                index.is_available('username', 'user%d' % number)
+
+    def test_stale_filters_answer_while_another_thread_rebuilds(self):
+        index = availability_index()
+        index.warm()
+        filters = index.filters
+        index.warmed_at -= index.refresh + 1
+        self.assertTrue(index._claim())  # Another thread is rebuilding
+        try:
+            self.assertFalse(index.warm())
+            with QueryBudget(0):
+                self.assertTrue(index.is_available('username', 'susan'))
+            self.assertIs(index.filters, filters)
+            index.add('susan@example.com', 'susan')
+            self.assertEqual(index._pending, [('susan@example.com', 'susan')])
+        finally:
+            index._pending = None
+
+    def test_cold_index_queries_while_another_thread_builds(self):
+        index = availability_index()
+        self.assertTrue(index._claim())
+        try:
+            with QueryBudget(1):
+                self.assertFalse(index.is_available('username', 'john'))
+            self.assertIsNone(index.filters)
+        finally:
+            index._pending = None
+
+    def test_warm_in_background(self):
+        index = availability_index()
+        with mock.patch('application.auth.availability.Thread') as thread:
+            index.warm_in_background(self.app)
+            index.warm_in_background(self.app)
+        thread.assert_called_once()
+        index._rebuild_in(self.app)
+        self.assertFalse(index.is_available('username', 'john'))
+        self.assertIsNone(index._pending)
+
+
+class BloomFilterTestCase(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        values = ['user%d' % number for number in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum('other%d' % number in bloom for number in range(1000))
+        self.assertLess(false_positives, 50)
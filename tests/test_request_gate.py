@@ -0,0 +1,63 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+from application import db
+from application.auth import user_free
+from application.models import User, identity_cache
+from tests.database import DatabaseTestCase
+from tests.query_budget import QueryBudget
+
+
+class RequestGateTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.add_url_rule('/plain', 'plain', lambda: 'plain')
+        self.app.add_url_rule('/public', 'public', user_free(lambda: 'public'))
+        self.user = User(email='john@example.com', username='john', password='cat')
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def login(self):
+        self.client.post('/auth/login', data={'email': 'john@example.com', 'password': 'cat'})
+
+    def loads(self):
+        stats = identity_cache().stats()
+        return stats['hits'] + stats['misses']
+
+    def test_unconfirmed_user_is_redirected(self):
+        self.login()
+        response = self.client.get('/plain')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith('/auth/unconfirmed'))
+
+    def test_static_and_user_free_views_skip_the_user(self):
+        self.login()
+        loads = self.loads()
+        with QueryBudget(0):
+            self.assertEqual(self.client.get('/static/favicon.ico').status_code, 200)
+            self.assertEqual(self.client.get('/public').get_data(as_text=True), 'public')
+        self.assertEqual(self.loads(), loads)
+
+    def test_confirmed_user_passes_from_the_session(self):
+        self.user.confirmed = True
+        db.session.commit()
+        self.login()
+        with self.client.session_transaction() as session:
+            self.assertEqual(session['confirmed'], str(self.user.id))
+        loads = self.loads()
+        with QueryBudget(0):
+            self.assertEqual(self.client.get('/plain').get_data(as_text=True), 'plain')
+        self.assertEqual(self.loads(), loads)
+
+    def test_confirm_and_logout_update_the_session(self):
+        self.login()
+        token = self.user.generate_confirmation_token()
+        self.client.get('/auth/confirm/' + token)
+        with self.client.session_transaction() as session:
+            self.assertEqual(session['confirmed'], str(self.user.id))
+        self.client.get('/auth/logout')
+        with self.client.session_transaction() as session:
+            self.assertNotIn('confirmed', session)
@@ -0,0 +1,54 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+from application import create_app, db
+from application.models import User
+
+
+class ReadReplicaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = create_app('testing')
+        self.app.config.update(SQLALCHEMY_DATABASE_URI=self.uri('primary'),
+                               SQLALCHEMY_BINDS={'replica': self.uri('replica')},
+                               APP_READ_REPLICAS=['replica'])
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.metadata.create_all(db.get_engine(bind='replica'))
+        db.session.add(User(email='primary@example.com', username='primary'))
+        db.session.commit()
+        db.session.remove()
+
+    def uri(self, name):
+        return 'sqlite:///' + os.path.join(self.directory.name, name + '.sqlite')
+
+    def tearDown(self):
+        db.session.remove()
+        db.get_engine().dispose()
+        db.get_engine(bind='replica').dispose()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def test_reads_go_to_replica(self):
+        self.assertIsNone(User.query.filter_by(username='primary').first())
+
+    def test_reads_after_write_go_to_primary(self):
+        db.session.add(User(email='susan@example.com', username='susan'))
+        db.session.commit()
+        self.assertIsNotNone(User.query.filter_by(username='primary').first())
+        self.assertIsNotNone(User.query.filter_by(username='susan').first())
+
+    def test_pin_lasts_for_one_session(self):
+        db.session.add(User(email='susan@example.com', username='susan'))
+        db.session.commit()
+        db.session.remove()
+        self.assertIsNone(User.query.filter_by(username='susan').first())
+
+    def test_without_replicas_everything_uses_primary(self):
+        self.app.config['APP_READ_REPLICAS'] = []
+        self.assertIsNotNone(User.query.filter_by(username='primary').first())
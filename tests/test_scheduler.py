@@ -0,0 +1,80 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+from application import db
+from application.models import JobRun, User, identity_cache, load_user
+from application.scheduler import JOBS, Scheduler
+from tests.database import DatabaseTestCase
+
+
+class SchedulerTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.app.config.update(APP_SCHEDULER_LOCK=os.path.join(self.directory.name, 'scheduler.lock'),
+                               APP_PURGE_UNCONFIRMED_DAYS=30,
+                               APP_PURGE_BATCH_SIZE=2)
+        self.scheduler = self.app.extensions['scheduler']
+
+    def tearDown(self):
+        self.scheduler.resign()
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_purge_removes_old_unconfirmed_users_only(self):
+        old = datetime.utcnow() - timedelta(days=31)
+        for number in range(5):
+            db.session.add(User(email='old%d@example.com' % number, username='old%d' % number, created_at=old))
+        db.session.add(User(email='kept@example.com', username='kept', confirmed=True, created_at=old))
+        db.session.add(User(email='new@example.com', username='new'))
+        db.session.commit()
+        run = self.scheduler.run_job('purge_unconfirmed')
+        self.assertEqual((run.status, run.result), ('ok', 'purged 5 users'))
+        self.assertEqual(sorted(user.username for user in User.query), ['kept', 'new'])
+        self.assertEqual(JobRun.query.filter_by(name='purge_unconfirmed').count(), 1)
+
+    def test_purged_users_leave_the_identity_cache(self):
+        user = User(email='old@example.com', username='old', created_at=datetime.utcnow() - timedelta(days=31))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        with self.app.test_request_context():
+            self.assertIsNotNone(load_user(user_id))
+            self.scheduler.run_job('purge_unconfirmed')
+            self.assertIsNone(identity_cache().get(user_id))
+            self.assertIsNone(load_user(user_id))
+
+    def test_maintenance_jobs_run(self):
+        for name in ('optimize', 'incremental_vacuum', 'wal_checkpoint'):
+            run = self.scheduler.run_job(name)
+            self.assertEqual(run.status, 'ok', run.result)
+            self.assertGreaterEqual(run.duration, 0)
+
+    def test_failed_job_is_recorded(self):
+        JOBS['broken'] = lambda config: 1 / 0
+        try:
+            run = self.scheduler.run_job('broken')
+        finally:
+            del JOBS['broken']
+        self.assertEqual(run.status, 'failed')
+        self.assertIn('ZeroDivisionError', run.result)
+
+    def test_one_leader_per_lock_file(self):
+        other = Scheduler()
+        other.app = self.app
+        self.assertTrue(self.scheduler.lead())
+        self.assertFalse(other.lead())
+        self.scheduler.resign()
+        self.assertTrue(other.lead())
+        other.resign()
+
+    def test_schedule_follows_recorded_runs(self):
+        self.app.config['APP_SCHEDULER_JOBS'] = {'optimize': 3600, 'wal_checkpoint': 3600, 'incremental_vacuum': 0}
+        db.session.add(JobRun(name='optimize', started_at=datetime.utcnow(), status='ok'))
+        db.session.commit()
+        self.assertEqual([run.name for run in self.scheduler.run_pending()], ['wal_checkpoint'])
+        self.assertEqual(self.scheduler.run_pending(), [])
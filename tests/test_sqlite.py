@@ -0,0 +1,45 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+from application import create_app, db
+from application.sqlite import configure_sqlite, database_stats
+from config import ProductionConfig
+
+
+class SQLiteProfileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = create_app('testing')
+        self.app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(self.directory.name, 'data.sqlite'),
+                               SQLALCHEMY_ENGINE_OPTIONS=ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS,
+                               SQLITE_PRAGMAS=ProductionConfig.SQLITE_PRAGMAS)
+        configure_sqlite(self.app)
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.get_engine().dispose()
+        self.app_context.pop()
+        self.directory.cleanup()
+
+    def test_pragmas_are_applied(self):
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute('PRAGMA journal_mode').scalar(), 'wal')
+            self.assertEqual(connection.execute('PRAGMA synchronous').scalar(), 1)
+            self.assertEqual(connection.execute('PRAGMA busy_timeout').scalar(), 30000)
+
+    def test_connections_are_pooled(self):
+        self.assertEqual(db.engine.pool.size(), 10)
+
+    def test_database_stats(self):
+        stats = database_stats()
+        self.assertEqual(stats['journal_mode'], 'wal')
+        self.assertGreater(stats['page_count'], 0)
+        self.assertIn('wal_bytes', stats)
+        self.assertIn('checkpointed_frames', stats)
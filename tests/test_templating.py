@@ -0,0 +1,41 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+import os
+import tempfile
+import unittest
+from application import create_app
+from application.templating import SharedBytecodeCache, compile_templates, configure_templates
+
+
+class TemplateCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_app(self):
+        app = create_app('testing')
+        app.config.update(APP_TEMPLATE_CACHE_DIR=self.directory.name, APP_TEMPLATE_WARMUP=True)
+        configure_templates(app)
+        return app
+
+    def test_warmup_compiles_every_template(self):
+        app = self.create_app()
+        names, elapsed = compile_templates(app)
+        self.assertIn('index.html', names)
+        self.assertIn('auth/email/confirm.txt', names)
+        self.assertIn('bootstrap/base.html', names)
+        self.assertIsInstance(app.jinja_env.bytecode_cache, SharedBytecodeCache)
+        self.assertEqual(len(os.listdir(self.directory.name)), len(names))
+
+    def test_cache_is_shared(self):
+        self.create_app()
+        files = {name: os.stat(os.path.join(self.directory.name, name)).st_mtime_ns
+                 for name in os.listdir(self.directory.name)}
+        app = self.create_app()
+        self.assertEqual({name: os.stat(os.path.join(self.directory.name, name)).st_mtime_ns
+                          for name in os.listdir(self.directory.name)}, files)
+        self.assertEqual(app.test_client().get('/').status_code, 200)
@@ -0,0 +1,54 @@
+# ------------------------------------------------------------------------------
+#  Copyright (c) 2020. Anas Abu Farraj.
+# ------------------------------------------------------------------------------
+
+from application import db
+from application.models import User
+from application.tokens import CONFIRM, RESET, VALID, EXPIRED, INVALID, get_serializer, generate_token, verify_token
+from tests.database import DatabaseTestCase
+
+
+class TokenTestCase(DatabaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User(email='john@example.com', username='john', password='cat')
+        self.other = User(email='susan@example.com', username='susan', password='dog')
+        db.session.add_all([self.user, self.other])
+        db.session.commit()
+
+    def test_valid_confirmation_token(self):
+        result = self.user.confirm_generated_token(self.user.generate_confirmation_token())
+        self.assertEqual(result.status, VALID)
+        self.assertTrue(self.user.confirmed)
+
+    def test_confirmation_token_of_another_user(self):
+        result = self.other.confirm_generated_token(self.user.generate_confirmation_token())
+        self.assertFalse(result)
+        self.assertFalse(self.other.confirmed)
+
+    def test_expired_confirmation_token(self):
+        result = self.user.confirm_generated_token(self.user.generate_confirmation_token(-1))
+        self.assertEqual(result.status, EXPIRED)
+
+    def test_tokens_are_bound_to_their_purpose(self):
+        self.assertEqual(verify_token(CONFIRM, self.user.generate_reset_token()).status, INVALID)
+        self.assertEqual(verify_token(RESET, self.user.generate_confirmation_token()).status, INVALID)
+        self.assertFalse(User.reset_password(self.user.generate_confirmation_token(), 'mouse'))
+
+    def test_reset_password(self):
+        self.assertTrue(User.reset_password(self.user.generate_reset_token(), 'mouse'))
+        db.session.commit()
+        self.assertTrue(self.user.verify_password('mouse'))
+
+    def test_garbage_token(self):
+        self.assertEqual(verify_token(CONFIRM, 'not-a-token').status, INVALID)
+
+    def test_key_rotation(self):
+        token = generate_token(CONFIRM, self.user.id)
+        self.app.config['APP_TOKEN_SECRET_KEYS'] = ['new-key', self.app.config['SECRET_KEY']]
+        self.assertEqual(verify_token(CONFIRM, token).user_id, self.user.id)
+        self.app.config['APP_TOKEN_SECRET_KEYS'] = ['new-key']
+        self.assertFalse(verify_token(CONFIRM, token))
+
+    def test_serializers_are_reused(self):
+        self.assertIs(get_serializer('key', CONFIRM, 60), get_serializer('key', CONFIRM, 60))